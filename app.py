@@ -1,48 +1,237 @@
-from flask import Flask, jsonify, request, render_template, redirect, url_for, session
+from flask import (Flask, Blueprint, Response, current_app, jsonify, request, render_template, redirect,
+                   url_for, session, send_from_directory, stream_with_context)
 from flask_cors import CORS
-from models import db, Temple, Prasadam, Order, User, Payment
-from datetime import datetime
+from werkzeug.middleware.proxy_fix import ProxyFix
+from models import db, Temple, Prasadam, Order, OrderItem, User, Payment
+from catalog import get_catalog, ensure_catalog_state, catalog_cache
+from catalog_io import import_catalog_command, export_catalog_command
+from order_export import export_orders_command, export_rows, encode_rows, parse_timestamp, ExportFilterError
+from order_items import order_items_for, order_item_values, item_sales, backfill_order_items_command, REPORT_GROUPS
+from sales_stats import (sales_rollup, parse_stats_range, rebuild_sales_stats_command, StatsRangeError,
+                         STATS_PERIODS, STATS_LEVELS)
+from stock import (reserve_stock, record_reservations, hold_reservations, set_stock,
+                   release_expired_stock_command, OutOfStock)
+from payment_queue import (enqueue_verification, payment_state, payment_workers, payment_worker_command,
+                           TERMINAL_PAYMENT_STATUSES)
+from auth_cache import token_cache, principal_from_user
+from session_store import (session_store, ServerSessionInterface, session_principal,
+                           sweep_sessions_command)
+from pricing import price_cart, parse_cart_items, load_price_table, PricingError
+from ids import id_generator, new_order_id, new_payment_order_id
+from passwords import password_hasher
+from idempotency import (get_idempotency_key, request_fingerprint, find_stored_response, find_stored_records,
+                         stored_response, validate_key, store_response, store_responses, IdempotencyError)
+from database import ensure_columns, ensure_indexes, database_uri, engine_options, configure_engine
+from instrumentation import init_instrumentation
+from compression import init_compression, negotiate_encoding, mark_encoded
+from rate_limit import rate_limited, init_load_shedding
+from json_provider import FastJSONProvider
+from metrics import metrics, init_metrics, pool_collector, cache_collector
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_, insert
+from sqlalchemy.exc import IntegrityError
 import os
-import uuid
-import hashlib
+import base64
+import math
+import time
 import jwt
+import click
 from functools import wraps
 
-app = Flask(__name__, 
-            static_folder='static',
-            template_folder='templates')
+basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Configuration - Make sure these are set BEFORE initializing db
-app.config['SECRET_KEY'] = 'e-prashadam-secret-key-2024'
-app.config['JWT_SECRET_KEY'] = 'e-prashadam-jwt-secret-2024'
+# Routes and CLI commands, registered on each app by create_app()
+main = Blueprint('main', __name__, cli_group=None)
 
-# Database configuration - Use absolute path
-basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'instance', 'eprashadam.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def load_config(app):
+    """Default configuration; environment variables override where noted"""
+    # Configuration - Make sure these are set BEFORE initializing db
+    app.config['SECRET_KEY'] = 'e-prashadam-secret-key-2024'
+    app.config['JWT_SECRET_KEY'] = 'e-prashadam-jwt-secret-2024'
+
+    # Database configuration - Use absolute path
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.environ.get('DATABASE_URL'),
+                                                         os.path.join(basedir, 'instance', 'eprashadam.db'))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Database profile - 'production' enables WAL and tuned pragmas on SQLite, 'development' keeps defaults
+    app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'production')
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+
+    # Session configuration
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SECURE'] = False
+    app.config['SESSION_PERMANENT'] = False
+    app.config['PERMANENT_SESSION_LIFETIME'] = 3600
+    # Server-side sessions - the cookie carries only an opaque id and the data lives in web_sessions
+    # (run init-db before enabling); sessions idle for PERMANENT_SESSION_LIFETIME expire
+    app.config['SERVER_SESSIONS'] = os.environ.get('SERVER_SESSIONS', 'false').lower() in ('1', 'true', 'yes')
+    app.config['SESSION_CACHE_SIZE'] = 10000
+    app.config['SESSION_CACHE_TTL'] = 60
+    app.config['SESSION_SWEEP_INTERVAL'] = 300
+
+    # Verified-token cache - bounded LRU, entries expire after TOKEN_CACHE_TTL seconds
+    app.config['TOKEN_CACHE_SIZE'] = 10000
+    app.config['TOKEN_CACHE_TTL'] = 60
+
+    # JSON encoder - 'auto' uses orjson when installed; 'orjson' or 'stdlib' forces one
+    app.config['JSON_BACKEND'] = os.environ.get('JSON_BACKEND', 'auto')
+    # Response compression - gzip/deflate for clients that accept it, bodies of at least COMPRESS_MIN_SIZE bytes
+    app.config['COMPRESS_RESPONSES'] = os.environ.get('COMPRESS_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_LEVEL'] = 6
+
+    # Rate limiting - token buckets per client IP and per user, shared by a host's workers through a SQLite file
+    app.config['RATE_LIMITING'] = os.environ.get('RATE_LIMITING', 'true').lower() in ('1', 'true', 'yes')
+    app.config['RATE_LIMIT_DB'] = os.environ.get('RATE_LIMIT_DB', os.path.join(basedir, 'instance', 'ratelimit.db'))
+    # Reverse proxies (nginx, load balancer) in front of the app whose X-Forwarded-For/-Proto
+    # are trusted; without this every client shares the proxy's address and its IP buckets
+    app.config['TRUSTED_PROXIES'] = int(os.environ.get('TRUSTED_PROXIES', 0))
+    # scope -> {'ip' or 'user': (burst size, seconds to refill a full bucket)}
+    app.config['RATE_LIMITS'] = {
+        'login': {'ip': (20, 60), 'user': (10, 300)},
+        'register': {'ip': (5, 600)},
+        'orders': {'ip': (60, 60), 'user': (20, 60)},
+    }
+    # Load shedding - requests in flight per worker process before answering 503 (0 disables)
+    app.config['MAX_CONCURRENT_REQUESTS'] = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 64))
+    # Long polls and scrapes hold no worker-heavy resources and must not be shed
+    app.config['CONCURRENCY_EXEMPT_ENDPOINTS'] = {'static', 'main.payment_status', 'main.metrics_endpoint',
+                                                  'main.health_check'}
+
+    # Order history page size
+    app.config['ORDERS_PAGE_SIZE'] = 20
+    app.config['ORDERS_PAGE_MAX'] = 100
+    # Most queued orders accepted by one /api/orders/batch request; each order also spends one
+    # token of the 'orders' rate limit. Larger batches get 413 with the size that fits as `limit`
+    app.config['ORDERS_BATCH_MAX'] = 100
+
+    # Catalog snapshot - seconds between checks of the stored catalog version
+    app.config['CATALOG_VERSION_CHECK_INTERVAL'] = 5
+    # Browser/service worker freshness for catalog responses before revalidating
+    app.config['CATALOG_CACHE_MAX_AGE'] = 60
+    # Catalog search result count
+    app.config['SEARCH_RESULTS_DEFAULT'] = 20
+    app.config['SEARCH_RESULTS_MAX'] = 50
+
+    # Order/payment ID generator - give every host its own node id (0-65535)
+    app.config['NODE_ID'] = int(os.environ.get('EPRASHADAM_NODE_ID', 0))
+
+    # Password hashing - scrypt or pbkdf2_sha256; raising the cost upgrades hashes on next login
+    app.config['PASSWORD_HASH_SCHEME'] = os.environ.get('PASSWORD_HASH_SCHEME', 'scrypt')
+    app.config['PASSWORD_SCRYPT_N'] = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14))
+    app.config['PASSWORD_SCRYPT_R'] = 8
+    app.config['PASSWORD_SCRYPT_P'] = 1
+    app.config['PASSWORD_PBKDF2_ITERATIONS'] = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+
+    # Per-request SQL instrumentation (Server-Timing headers and slow-request log), off by default
+    app.config['SQL_INSTRUMENTATION'] = os.environ.get('SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    app.config['SLOW_QUERY_MS'] = int(os.environ.get('SLOW_QUERY_MS', 100))
+    app.config['SLOW_REQUEST_MAX_QUERIES'] = int(os.environ.get('SLOW_REQUEST_MAX_QUERIES', 20))
+
+    # Metrics - set METRICS_DIR to a directory shared by all workers to aggregate across processes
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = 5
+
+    # Admin API access - comma-separated account emails
+    app.config['ADMIN_EMAILS'] = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',')
+                                  if email.strip()}
+
+    # Payment configuration
+    app.config['PAYMENT_MODE'] = 'TEST'
+    app.config['RAZORPAY_KEY_ID'] = 'rzp_test_YourTestKeyHere'
+    app.config['RAZORPAY_KEY_SECRET'] = 'YourTestSecretHere'
+
+    # Payment verification queue - gateway checks run on worker threads, off the request path
+    app.config['PAYMENT_GATEWAY'] = os.environ.get('PAYMENT_GATEWAY', 'local')  # local (stand-in) or razorpay
+    app.config['PAYMENT_GATEWAY_TIMEOUT'] = 10
+    app.config['LOCAL_GATEWAY_LATENCY'] = float(os.environ.get('LOCAL_GATEWAY_LATENCY', 0))  # seconds
+    app.config['PAYMENT_WORKERS'] = int(os.environ.get('PAYMENT_WORKERS', 2))
+    # Off when a dedicated `flask --app app payment-worker` process handles the queue
+    app.config['PAYMENT_WORKERS_IN_PROCESS'] = os.environ.get('PAYMENT_WORKERS_IN_PROCESS', 'true').lower() in ('1', 'true', 'yes')
+    app.config['PAYMENT_JOB_LEASE'] = 60
+    app.config['PAYMENT_JOB_MAX_ATTEMPTS'] = 5
+    app.config['PAYMENT_QUEUE_POLL_INTERVAL'] = 0.5
+    app.config['PAYMENT_STATUS_MAX_WAIT'] = 25
+
+    # Seconds limited-stock items stay reserved for an unpaid order before going back on sale
+    app.config['STOCK_RESERVATION_TTL'] = int(os.environ.get('STOCK_RESERVATION_TTL', 900))
 
-# Session configuration
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SECURE'] = False
-app.config['SESSION_PERMANENT'] = False
-app.config['PERMANENT_SESSION_LIFETIME'] = 3600
+def create_app(config=None):
+    """Application factory.
 
-# Payment configuration
-app.config['PAYMENT_MODE'] = 'TEST'
-app.config['RAZORPAY_KEY_ID'] = 'rzp_test_YourTestKeyHere'
-app.config['RAZORPAY_KEY_SECRET'] = 'YourTestSecretHere'
+    Boot does no database work, so starting or recycling a worker is cheap.
+    Run `flask --app app init-db` once per deploy to create the schema and seed it.
+    """
+    app = Flask(__name__, 
+                static_folder='static',
+                template_folder='templates')
+    load_config(app)
+    if config:
+        app.config.update(config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    app.json = FastJSONProvider(app, backend=app.config['JSON_BACKEND'])
+    if app.config['TRUSTED_PROXIES']:
+        # request.remote_addr becomes the client address the proxies saw
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
 
-# Initialize CORS
-CORS(app, supports_credentials=True, origins=["http://localhost:5000"])
+    token_cache.configure(maxsize=app.config['TOKEN_CACHE_SIZE'], ttl=app.config['TOKEN_CACHE_TTL'])
+    if app.config['SERVER_SESSIONS']:
+        session_store.configure(maxsize=app.config['SESSION_CACHE_SIZE'], cache_ttl=app.config['SESSION_CACHE_TTL'],
+                                sweep_interval=app.config['SESSION_SWEEP_INTERVAL'])
+        app.session_interface = ServerSessionInterface()
+    id_generator.configure(node_id=app.config['NODE_ID'])
+    password_hasher.configure(
+        scheme=app.config['PASSWORD_HASH_SCHEME'],
+        scrypt_n=app.config['PASSWORD_SCRYPT_N'],
+        scrypt_r=app.config['PASSWORD_SCRYPT_R'],
+        scrypt_p=app.config['PASSWORD_SCRYPT_P'],
+        pbkdf2_iterations=app.config['PASSWORD_PBKDF2_ITERATIONS'],
+        workers=app.config['PASSWORD_HASH_WORKERS']
+    )
 
-# Initialize database - This must come AFTER configuration
-db.init_app(app)
+    # Initialize CORS
+    CORS(app, supports_credentials=True, origins=["http://localhost:5000"])
 
-# Create instance folder if it doesn't exist
-instance_path = os.path.join(basedir, 'instance')
-if not os.path.exists(instance_path):
-    os.makedirs(instance_path)
+    # Initialize database - This must come AFTER configuration
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(app)
+    init_instrumentation(app)
+    init_metrics(app)
+    init_load_shedding(app)  # After the metrics timer, so shed requests are still counted
+    init_compression(app)  # Registered last so it runs first: timings and logs include it
+    with app.app_context():
+        metrics.add_collector('db_pool', pool_collector(db.engine))
+    metrics.add_collector('catalog_cache', cache_collector('catalog', catalog_cache))
+    metrics.add_collector('token_cache', cache_collector('token', token_cache))
+    if app.config['SERVER_SESSIONS']:
+        metrics.add_collector('session_cache', cache_collector('session', session_store))
+
+    # Create instance folder if it doesn't exist
+    instance_path = os.path.join(basedir, 'instance')
+    if not os.path.exists(instance_path):
+        os.makedirs(instance_path)
+
+    app.register_blueprint(main)
+    app.cli.add_command(import_catalog_command)
+    app.cli.add_command(export_catalog_command)
+    app.cli.add_command(export_orders_command)
+    app.cli.add_command(backfill_order_items_command)
+    app.cli.add_command(rebuild_sales_stats_command)
+    app.cli.add_command(payment_worker_command)
+    app.cli.add_command(release_expired_stock_command)
+    app.cli.add_command(sweep_sessions_command)
+    return app
 
 # Authentication decorator
 def token_required(f):
@@ -59,14 +248,33 @@ def token_required(f):
             token = session['token']
         
         if not token:
-            return jsonify({'success': False, 'message': 'Token is missing!'}), 401
+            # Server-side session: the user was resolved when the session was loaded
+            current_user = session_principal(session)
+            if not current_user:
+                return jsonify({'success': False, 'message': 'Token is missing!'}), 401
+            if not current_user.is_active:
+                return jsonify({'success': False, 'message': 'Account is disabled'}), 403
+            return f(current_user, *args, **kwargs)
+        
+        # Fast path: token already verified by this process
+        current_user = token_cache.get(token)
+        if current_user:
+            if not current_user.is_active:
+                return jsonify({'success': False, 'message': 'Account is disabled'}), 403
+            return f(current_user, *args, **kwargs)
         
         try:
-            data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
+            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
+            user = db.session.get(User, data['user_id'])
             
-            if not current_user:
+            if not user:
                 return jsonify({'success': False, 'message': 'User not found!'}), 401
+            
+            current_user = principal_from_user(user)
+            token_cache.put(token, current_user, data.get('exp'))
+            
+            if not current_user.is_active:
+                return jsonify({'success': False, 'message': 'Account is disabled'}), 403
                 
         except jwt.ExpiredSignatureError:
             return jsonify({'success': False, 'message': 'Token has expired!'}), 401
@@ -79,8 +287,111 @@ def token_required(f):
     
     return decorated
 
+def admin_required(f):
+    """token_required, plus the account must be listed in ADMIN_EMAILS"""
+    @wraps(f)
+    @token_required
+    def decorated(current_user, *args, **kwargs):
+        if current_user.email.lower() not in current_app.config['ADMIN_EMAILS']:
+            return jsonify({'success': False, 'message': 'Admin access required'}), 403
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
+
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return password_hasher.hash_in_pool(password)
+
+def encode_order_cursor(order):
+    """Opaque keyset cursor for the (created_at, id) position of an order"""
+    raw = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_order_cursor(cursor):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def catalog_response(snapshot, name, payload):
+    """JSON response for a catalog resource with ETag/Last-Modified validation.
+
+    Answers 304 from the snapshot alone when the client's copy is current,
+    so payload() is only serialized for clients that need the body. Plain
+    and compressed bodies are kept on the snapshot and reused until the
+    catalog version changes.
+    """
+    etag = f"{name}-{snapshot.version}"
+    last_modified = None
+    if snapshot.updated_at:
+        last_modified = snapshot.updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and last_modified <= request.if_modified_since)
+
+    config = current_app.config
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        body = snapshot.body(name, payload)
+        encoding = negotiate_encoding() if config['COMPRESS_RESPONSES'] else None
+        if encoding and len(body) >= config['COMPRESS_MIN_SIZE']:
+            response = current_app.response_class(snapshot.body(name, payload, encoding),
+                                                  mimetype='application/json')
+            mark_encoded(response, encoding)
+        else:
+            response = current_app.response_class(body, mimetype='application/json')
+    # Weak: the plain and compressed bodies are the same resource
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = config['CATALOG_CACHE_MAX_AGE']
+    return response
+
+def order_values(user, data, cart):
+    """Column values of a new order for a priced cart"""
+    return {
+        'order_id': new_order_id(),
+        'user_id': user.id,
+        'user_name': data['user_name'],
+        'user_email': data['user_email'],
+        'user_phone': data['user_phone'],
+        'user_address': data['user_address'],
+        'items': cart.lines,
+        'total_amount': cart.total_amount,
+        'status': 'payment_pending'
+    }
+
+def payment_values(cart):
+    """Column values of the pending payment created with an order"""
+    return {
+        'payment_order_id': new_payment_order_id(),
+        'amount': cart.total_amount,
+        'currency': 'INR',
+        'status': 'pending'
+    }
+
+def order_created_body(order_id, payment_order_id, cart):
+    """Response body for a new order"""
+    return {
+        'success': True,
+        'message': 'Order created. Proceed to payment.',
+        'order_id': order_id,
+        'payment_order_id': payment_order_id,
+        'total_amount': cart.total_amount
+    }
+
+def replay_response(body, status):
+    """Response for a request already processed under the same Idempotency-Key"""
+    response = jsonify(body)
+    response.status_code = status
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
 
 def seed_database():
     """Seed the database with initial data"""
@@ -212,27 +523,25 @@ def seed_database():
     ]
     
     try:
-        # Add temples to database
-        for temple_data in jyotirlingas + dhams:
-            temple = Temple(
+        # Add temples with their prasadam items; the unit of work batches each table's INSERTs
+        db.session.add_all([
+            Temple(
                 name=temple_data['name'],
                 location=temple_data['location'],
                 type=temple_data['type'],
-                description=temple_data['description']
+                description=temple_data['description'],
+                prasadam_items=[
+                    Prasadam(
+                        name=prasad_item,
+                        description=f"Blessed prasadam from {temple_data['name']}",
+                        price=150.0 + len(prasad_item) * 10,
+                        available=True
+                    )
+                    for prasad_item in temple_data['prasadam']
+                ]
             )
-            db.session.add(temple)
-            db.session.flush()  # Get the temple ID
-            
-            # Add prasadam items
-            for prasad_item in temple_data['prasadam']:
-                prasadam = Prasadam(
-                    temple_id=temple.id,
-                    name=prasad_item,
-                    description=f"Blessed prasadam from {temple.name}",
-                    price=150.0 + len(prasad_item) * 10,
-                    available=True
-                )
-                db.session.add(prasadam)
+            for temple_data in jyotirlingas + dhams
+        ])
         
         # Create a demo user if no users exist
         if User.query.count() == 0:
@@ -254,55 +563,80 @@ def seed_database():
         print(f"Error seeding database: {e}")
         raise e
 
-# Create tables and seed data
-with app.app_context():
-    try:
-        print("Creating database tables...")
-        db.create_all()
-        print("Database tables created successfully!")
-        
+def init_database(seed=True):
+    """Create missing tables and indexes, then seed an empty database"""
+    print("Creating database tables...")
+    db.create_all()
+    ensure_columns()
+    ensure_indexes()
+    ensure_catalog_state()
+    print("Database tables created successfully!")
+    
+    if seed:
         print("Checking if database needs seeding...")
         seed_database()
-        
-    except Exception as e:
-        print(f"Error during database initialization: {e}")
-        raise e
+
+# Create tables and seed data: flask --app app init-db
+@main.cli.command('init-db')
+@click.option('--seed/--no-seed', default=True, help='Seed temples, prasadam and the demo user into an empty database')
+def init_db_command(seed):
+    """Create tables and indexes and seed initial data"""
+    init_database(seed=seed)
+
+def signed_in():
+    """Whether the browser session belongs to a signed-in user.
+
+    With server-side sessions this is the user resolved when the session was
+    loaded, so an ended session or a disabled account no longer counts.
+    """
+    if current_app.config['SERVER_SESSIONS']:
+        principal = session_principal(session)
+        return principal is not None and principal.is_active
+    return 'user_id' in session
 
 # Routes
-@app.route('/')
+@main.route('/')
 def home():
     """Root route - redirect based on login status"""
-    if 'user_id' in session:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login_page'))
+    if signed_in():
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.login_page'))
 
-@app.route('/login')
+@main.route('/login')
 def login_page():
     """Serve login/signup page"""
-    if 'user_id' in session:
-        return redirect(url_for('dashboard'))
+    if signed_in():
+        return redirect(url_for('main.dashboard'))
     return render_template('auth.html')
 
-@app.route('/signup')
+@main.route('/signup')
 def signup_page():
     """Serve signup page - redirect to login with signup hash"""
-    return redirect(url_for('login_page', _anchor='signup'))
+    return redirect(url_for('main.login_page', _anchor='signup'))
 
-@app.route('/dashboard')
+@main.route('/dashboard')
 def dashboard():
     """Serve main dashboard after login"""
-    if 'user_id' not in session:
-        return redirect(url_for('login_page'))
+    if not signed_in():
+        return redirect(url_for('main.login_page'))
     return render_template('index.html')
 
-@app.route('/logout')
+@main.route('/sw.js')
+def service_worker():
+    """Serve the service worker from the site root so its scope covers every page"""
+    response = send_from_directory(current_app.root_path, 'sw.js', mimetype='application/javascript', max_age=0)
+    response.cache_control.no_cache = True  # Browsers pick up a new worker on the next visit
+    return response
+
+@main.route('/logout')
 def logout_route():
     """Logout and redirect to login"""
     session.clear()
-    return redirect(url_for('login_page'))
+    return redirect(url_for('main.login_page'))
 
 # Authentication API Endpoints
-@app.route('/api/auth/register', methods=['POST'])
+@main.route('/api/auth/register', methods=['POST'])
+@rate_limited('register')
 def register():
     """Register a new user"""
     try:
@@ -337,7 +671,7 @@ def register():
             'user_id': new_user.id,
             'email': new_user.email,
             'exp': datetime.utcnow().timestamp() + 86400
-        }, app.config['JWT_SECRET_KEY'], algorithm="HS256")
+        }, current_app.config['JWT_SECRET_KEY'], algorithm="HS256")
         
         return jsonify({
             'success': True,
@@ -355,7 +689,13 @@ def register():
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+def login_email():
+    """Account a login attempt targets, for per-account rate limiting"""
+    data = request.get_json(silent=True)
+    return data.get('email') if isinstance(data, dict) else None
+
+@main.route('/api/auth/login', methods=['POST'])
+@rate_limited('login', user_key=login_email)
 def login():
     """User login"""
     try:
@@ -369,10 +709,13 @@ def login():
         user = User.query.filter_by(email=data['email']).first()
         
         if not user:
+            # Spend the same KDF time as a wrong password so response times do not reveal accounts
+            password_hasher.check_in_pool(data['password'], password_hasher.dummy_hash)
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
         
-        # Verify password
-        if user.password_hash != hash_password(data['password']):
+        # Verify password; outdated hashes are upgraded below on success
+        valid, upgraded_hash = password_hasher.check_in_pool(data['password'], user.password_hash)
+        if not valid:
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
         
         # Check if user is active
@@ -384,16 +727,19 @@ def login():
             'user_id': user.id,
             'email': user.email,
             'exp': datetime.utcnow().timestamp() + 86400
-        }, app.config['JWT_SECRET_KEY'], algorithm="HS256")
+        }, current_app.config['JWT_SECRET_KEY'], algorithm="HS256")
         
-        # Store in session
+        # Store in session; server-side sessions resolve the user without the token
         session['user_id'] = user.id
         session['user_email'] = user.email
         session['user_name'] = user.name
-        session['token'] = token
+        if not current_app.config['SERVER_SESSIONS']:
+            session['token'] = token
         
         # Update last login
         user.last_login = datetime.utcnow()
+        if upgraded_hash:
+            user.password_hash = upgraded_hash
         db.session.commit()
         
         return jsonify({
@@ -412,7 +758,7 @@ def login():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/auth/logout', methods=['POST'])
+@main.route('/api/auth/logout', methods=['POST'])
 def logout():
     """User logout"""
     try:
@@ -421,100 +767,283 @@ def logout():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/auth/me', methods=['GET'])
+@main.route('/api/auth/me', methods=['GET'])
 @token_required
 def get_current_user(current_user):
     """Get current user info"""
+    user = db.session.get(User, current_user.id)
+    if not user:
+        token_cache.invalidate_user(current_user.id)
+        return jsonify({'success': False, 'message': 'User not found!'}), 401
     return jsonify({
         'success': True,
         'user': {
-            'id': current_user.id,
-            'name': current_user.name,
-            'email': current_user.email,
-            'phone': current_user.phone,
-            'address': current_user.address,
-            'created_at': current_user.created_at.strftime('%Y-%m-%d %H:%M:%S') if current_user.created_at else None
+            'id': user.id,
+            'name': user.name,
+            'email': user.email,
+            'phone': user.phone,
+            'address': user.address,
+            'created_at': user.created_at.strftime('%Y-%m-%d %H:%M:%S') if user.created_at else None
         }
     })
 
 # Protected API Endpoints
-@app.route('/api/temples', methods=['GET'])
+@main.route('/api/temples', methods=['GET'])
 @token_required
 def get_temples(current_user):
     """Get all temples (protected)"""
-    temples = Temple.query.all()
-    return jsonify([{
-        'id': t.id,
-        'name': t.name,
-        'location': t.location,
-        'type': t.type,
-        'description': t.description
-    } for t in temples])
-
-@app.route('/api/prasadam', methods=['GET'])
+    snapshot = get_catalog()
+    return catalog_response(snapshot, 'temples', lambda: snapshot.temples)
+
+@main.route('/api/prasadam', methods=['GET'])
 @token_required
 def get_all_prasadam(current_user):
     """Get all available prasadam items (protected)"""
-    prasadam_items = Prasadam.query.filter_by(available=True).all()
-    return jsonify([{
-        'id': p.id,
-        'name': p.name,
-        'description': p.description,
-        'price': p.price,
-        'temple_name': Temple.query.get(p.temple_id).name,
-        'temple_type': Temple.query.get(p.temple_id).type
-    } for p in prasadam_items])
-
-@app.route('/api/create-order', methods=['POST'])
+    snapshot = get_catalog()
+    return catalog_response(snapshot, 'prasadam', lambda: snapshot.prasadam)
+
+@main.route('/api/temples/<int:temple_id>/prasadam', methods=['GET'])
 @token_required
+def get_temple_prasadam(current_user, temple_id):
+    """Get available prasadam items of one temple (protected)"""
+    snapshot = get_catalog()
+    if temple_id not in snapshot.temple_ids:
+        return jsonify({'success': False, 'message': 'Temple not found'}), 404
+    return catalog_response(snapshot, f'temple-{temple_id}-prasadam',
+                            lambda: snapshot.temple_prasadam(temple_id))
+
+@main.route('/api/search', methods=['GET'])
+@token_required
+def search_catalog(current_user):
+    """Ranked prefix search over temples and available prasadam (protected)"""
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type')
+    if kind not in (None, 'temple', 'prasadam'):
+        return jsonify({'success': False, 'message': 'type must be temple or prasadam'}), 400
+    try:
+        limit = min(int(request.args.get('limit', current_app.config['SEARCH_RESULTS_DEFAULT'])),
+                    current_app.config['SEARCH_RESULTS_MAX'])
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit must be a positive integer'}), 400
+    if not query:
+        return jsonify({'success': False, 'message': 'q is required'}), 400
+
+    matches = get_catalog().search_index().search(query, kind, limit)
+    return jsonify([dict(record, type=match_kind, score=score) for match_kind, record, score in matches])
+
+@main.route('/api/create-order', methods=['POST'])
+@token_required
+@rate_limited('orders')
 def create_order_with_payment(current_user):
-    """Create a new order with payment initiation (protected)"""
+    """Create a new order with payment initiation (protected).
+
+    The order and its payment are written in one transaction. Clients may
+    send an Idempotency-Key header; a retry with the same key gets the
+    original response back instead of creating another order.
+    """
     try:
         data = request.json
         
-        # Generate unique order ID
-        order_id = str(uuid.uuid4())[:8].upper()
-        
-        # Create order record with user_id
-        order = Order(
-            order_id=order_id,
-            user_id=current_user.id,
-            user_name=data['user_name'],
-            user_email=data['user_email'],
-            user_phone=data['user_phone'],
-            user_address=data['user_address'],
-            items=data['items'],
-            total_amount=data['total_amount'],
-            status='payment_pending'
-        )
-        db.session.add(order)
-        db.session.commit()
+        try:
+            idempotency_key = get_idempotency_key()
+            if idempotency_key:
+                request_hash = request_fingerprint(data)
+                stored = find_stored_response(current_user.id, idempotency_key, request.path, request_hash)
+                if stored:
+                    return replay_response(*stored)
+        except IdempotencyError as e:
+            return jsonify({'success': False, 'message': str(e)}), 422
         
-        # Create payment record
-        payment = Payment(
-            order_id=order.id,
-            payment_order_id=order_id + '_PAY',
-            amount=data['total_amount'],
-            currency='INR',
-            status='pending'
-        )
-        db.session.add(payment)
-        db.session.commit()
+        # Price the cart server-side; client prices and totals are ignored
+        try:
+            cart = price_cart(data.get('items'))
+        except PricingError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
-        return jsonify({
-            'success': True,
-            'message': 'Order created. Proceed to payment.',
-            'order_id': order.id,
-            'payment_order_id': payment.payment_order_id
-        })
+        # Reserve limited items; the reservation commits or rolls back with the order
+        try:
+            taken = reserve_stock(cart)
+        except OutOfStock as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 409
+        
+        # Create the order and its payment in the same transaction
+        order = Order(**order_values(current_user, data, cart), order_items=order_items_for(cart.lines))
+        payment = Payment(order=order, **payment_values(cart))
+        db.session.add_all([order, payment])
+        db.session.flush()  # Assign order.id for the response
+        record_reservations({order.id: taken})
+        
+        body = order_created_body(order.id, payment.payment_order_id, cart)
+        if idempotency_key:
+            store_response(current_user.id, idempotency_key, request.path, request_hash, body)
+        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent retry with the same key won the race; return its response
+            db.session.rollback()
+            if not idempotency_key:
+                raise
+            stored = find_stored_response(current_user.id, idempotency_key, request.path, request_hash)
+            if not stored:
+                raise
+            return replay_response(*stored)
+        
+        metrics.inc('eprashadam_orders_created_total')
+        return jsonify(body)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+ORDER_FIELDS = ('user_name', 'user_email', 'user_phone', 'user_address')
+
+def batch_order_count():
+    """Rate-limit cost of a batch: each order in it counts as one, like a single create-order"""
+    data = request.get_json(silent=True)
+    entries = data.get('orders') if isinstance(data, dict) else None
+    return len(entries) if isinstance(entries, list) and entries else 1
+
+def create_order_batch(user, entries):
+    """Create the new orders of a batch in one transaction -> one result per entry.
+
+    Stored keys are looked up in one query, every cart is priced against one
+    price table and each table gets one bulk INSERT, so a batch costs the
+    same handful of statements however many orders it carries. Results for keys already used replay the stored
+    response; invalid entries fail on their own without affecting the rest.
+    Raises IntegrityError when a concurrent request stored one of the keys.
+    """
+    # Keys are shared with /api/create-order, so a retry may go through either endpoint
+    endpoint = url_for('main.create_order_with_payment')
+    results = [None] * len(entries)
+
+    def fail(index, key, status, message):
+        results[index] = {'idempotency_key': key, 'status': status, 'replayed': False,
+                          'body': {'success': False, 'message': message}}
+
+    pending = []
+    seen = set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            fail(index, None, 400, 'Each order must be an object')
+            continue
+        try:
+            key = validate_key(entry.get('idempotency_key'))
+        except IdempotencyError as e:
+            fail(index, entry.get('idempotency_key'), 422, str(e))
+            continue
+        if key in seen:
+            fail(index, key, 422, 'idempotency_key is repeated within the batch')
+            continue
+        seen.add(key)
+        data = {field: value for field, value in entry.items() if field != 'idempotency_key'}
+        pending.append((index, key, data))
+
+    records = find_stored_records(user.id, [key for _, key, _ in pending])
+    new_orders = []
+    for index, key, data in pending:
+        request_hash = request_fingerprint(data)
+        record = records.get(key)
+        if record is not None:
+            try:
+                body, status = stored_response(record, endpoint, request_hash)
+            except IdempotencyError as e:
+                fail(index, key, 422, str(e))
+                continue
+            results[index] = {'idempotency_key': key, 'status': status, 'replayed': True, 'body': body}
+            continue
+        missing = [field for field in ORDER_FIELDS if not data.get(field)]
+        if missing:
+            fail(index, key, 400, f"Missing fields: {', '.join(missing)}")
+            continue
+        try:
+            quantities = parse_cart_items(data.get('items'))
+        except PricingError as e:
+            fail(index, key, 400, str(e))
+            continue
+        new_orders.append((index, key, data, request_hash, quantities))
+
+    price_table = load_price_table(list({item_id for *_, quantities in new_orders for item_id in quantities}))
+    created = []
+    for index, key, data, request_hash, _ in new_orders:
+        try:
+            cart = price_cart(data['items'], price_table)
+            taken = reserve_stock(cart)
+        except PricingError as e:
+            fail(index, key, 400, str(e))
+            continue
+        except OutOfStock as e:
+            fail(index, key, 409, str(e))
+            continue
+        created.append((index, key, request_hash, cart, taken, order_values(user, data, cart),
+                        payment_values(cart)))
+
+    if not created:
+        db.session.rollback()
+        return results
+    order_ids = dict(db.session.execute(
+        insert(Order).returning(Order.order_id, Order.id),
+        [order for *_, order, _ in created]
+    ).all())
+    payment_rows, item_rows, responses, reservations = [], [], [], {}
+    for index, key, request_hash, cart, taken, order, payment in created:
+        order_id = order_ids[order['order_id']]
+        reservations[order_id] = taken
+        payment_rows.append({'order_id': order_id, **payment})
+        item_rows += [{'order_id': order_id, **values} for values in order_item_values(cart.lines)]
+        body = order_created_body(order_id, payment['payment_order_id'], cart)
+        responses.append((key, request_hash, body, 200))
+        results[index] = {'idempotency_key': key, 'status': 200, 'replayed': False, 'body': body}
+    db.session.execute(insert(Payment), payment_rows)
+    db.session.execute(insert(OrderItem), item_rows)
+    record_reservations(reservations)
+    store_responses(user.id, endpoint, responses)
+    db.session.commit()
+    metrics.inc('eprashadam_orders_created_total', len(created))
+    return results
+
+@main.route('/api/orders/batch', methods=['POST'])
+@token_required
+@rate_limited('orders', cost=batch_order_count)
+def create_orders_batch(current_user):
+    """Create many orders queued while offline in one request (protected).
+
+    Body: {"orders": [{"idempotency_key", "user_name", "user_email",
+    "user_phone", "user_address", "items"}, ...]}. Every order needs its own
+    idempotency key, so replaying a batch after a dropped connection returns
+    the original results. Answers 200 with one result per order, in order.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        entries = data.get('orders')
+        if not isinstance(entries, list) or not entries:
+            return jsonify({'success': False, 'message': 'orders must be a non-empty list'}), 400
+        limit = current_app.config['ORDERS_BATCH_MAX']
+        if len(entries) > limit:
+            return jsonify({'success': False, 'limit': limit,
+                            'message': f'A batch can contain at most {limit} orders'}), 413
+        
+        try:
+            results = create_order_batch(current_user, entries)
+        except IntegrityError:
+            # A concurrent request stored one of the keys first; the retry replays it
+            db.session.rollback()
+            results = create_order_batch(current_user, entries)
+        return jsonify({'success': True, 'results': results})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@app.route('/api/verify-payment', methods=['POST'])
+@main.route('/api/verify-payment', methods=['POST'])
 @token_required
 def verify_payment(current_user):
-    """Verify payment success (protected)"""
+    """Queue payment verification (protected).
+
+    Answers 202 without waiting on the gateway; the check runs on the payment
+    worker pool and clients follow it at /api/payments/<payment_order_id>/status.
+    """
     try:
         data = request.json
         
@@ -522,25 +1051,47 @@ def verify_payment(current_user):
         
         if payment:
             # Check if order belongs to current user
-            order = Order.query.get(payment.order_id)
+            order = db.session.get(Order, payment.order_id)
             if order.user_id != current_user.id:
                 return jsonify({'success': False, 'message': 'Unauthorized access'}), 403
             
-            payment.status = 'completed'
-            payment.payment_id = data.get('payment_id', 'demo_payment_' + str(uuid.uuid4())[:8])
-            payment.payment_method = data.get('payment_method', 'card')
+            status_url = url_for('main.payment_status', payment_order_id=payment.payment_order_id)
+            if payment.status == 'completed':
+                return jsonify({
+                    'success': True,
+                    'message': 'Payment verified successfully!',
+                    'status': 'completed',
+                    'order_id': order.id,
+                    'payment_id': payment.payment_id,
+                    'status_url': status_url
+                })
             
-            # Update order status
-            order.status = 'confirmed'
+            # Limited items stay reserved while the payment is verified, unless already released
+            if not hold_reservations(order.id):
+                db.session.rollback()
+                return jsonify({
+                    'success': False,
+                    'message': 'The items reserved for this order are no longer held. Please place the order again.'
+                }), 409
             
+            job = enqueue_verification(
+                payment,
+                gateway_payment_id=data.get('razorpay_payment_id') or data.get('payment_id'),
+                signature=data.get('razorpay_signature') or data.get('signature'),
+                payment_method=data.get('payment_method')
+            )
             db.session.commit()
+            if current_app.config['PAYMENT_WORKERS_IN_PROCESS']:
+                payment_workers.ensure_started(current_app._get_current_object())
+            payment_workers.wake()
             
             return jsonify({
                 'success': True,
-                'message': 'Payment verified successfully!',
+                'message': 'Payment verification queued',
+                'status': job.status,
                 'order_id': order.id,
-                'payment_id': payment.payment_id
-            })
+                'status_url': status_url
+            }), 202
         
         return jsonify({'success': False, 'message': 'Payment not found'}), 404
         
@@ -548,15 +1099,67 @@ def verify_payment(current_user):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@app.route('/api/my-orders', methods=['GET'])
+@main.route('/api/payments/<payment_order_id>/status', methods=['GET'])
 @token_required
-def get_my_orders(current_user):
-    """Get orders for current user (protected)"""
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
+def payment_status(current_user, payment_order_id):
+    """Verification status of a payment; ?wait=N long-polls up to N seconds for a final state (protected)"""
+    try:
+        wait = float(request.args.get('wait', 0))
+        if not math.isfinite(wait):
+            raise ValueError  # nan would never reach the deadline
+        wait = max(min(wait, current_app.config['PAYMENT_STATUS_MAX_WAIT']), 0)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'wait must be a number of seconds'}), 400
     
+    deadline = time.monotonic() + wait
+    while True:
+        state = payment_state(payment_order_id, current_user.id)
+        db.session.close()  # Hold no connection while waiting
+        if state is None:
+            return jsonify({'success': False, 'message': 'Payment not found'}), 404
+        remaining = deadline - time.monotonic()
+        if state['status'] in TERMINAL_PAYMENT_STATUSES or remaining <= 0:
+            return jsonify(dict(state, success=True))
+        payment_workers.wait_for_update(min(remaining, current_app.config['PAYMENT_QUEUE_POLL_INTERVAL']))
+
+@main.route('/api/my-orders', methods=['GET'])
+@token_required
+def get_my_orders(current_user):
+    """Get orders for current user, newest first, with keyset pagination (protected)"""
+    try:
+        limit = min(int(request.args.get('limit', current_app.config['ORDERS_PAGE_SIZE'])), current_app.config['ORDERS_PAGE_MAX'])
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit must be a positive integer'}), 400
+
+    query = Order.query.filter_by(user_id=current_user.id)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            created_at, last_id = decode_order_cursor(cursor)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+        query = query.filter(or_(
+            Order.created_at < created_at,
+            and_(Order.created_at == created_at, Order.id < last_id)
+        ))
+
+    orders = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+
+    # One query for the payment status of the whole page
+    payments = {}
+    if orders:
+        for payment in Payment.query.filter(Payment.order_id.in_([o.id for o in orders]))\
+                .order_by(Payment.id.desc()):
+            payments[payment.order_id] = payment
+
     order_list = []
     for o in orders:
-        payment = Payment.query.filter_by(order_id=o.id).first()
+        payment = payments.get(o.id)
         order_list.append({
             'id': o.id,
             'order_id': o.order_id,
@@ -568,11 +1171,96 @@ def get_my_orders(current_user):
             'payment_status': payment.status if payment else 'N/A',
             'created_at': o.created_at.strftime('%Y-%m-%d %H:%M:%S') if o.created_at else None
         })
-    
-    return jsonify(order_list)
+
+    response = jsonify(order_list)
+    if has_more:
+        response.headers['X-Next-Cursor'] = encode_order_cursor(orders[-1])
+    return response
+
+# Admin: streaming order export for reconciliation
+@main.route('/api/admin/orders/export', methods=['GET'])
+@admin_required
+def export_orders(current_user):
+    """Stream orders joined with payments as CSV or JSON Lines (admin only)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'format must be csv or jsonl'}), 400
+    try:
+        since = parse_timestamp(request.args.get('since'), 'since')
+        until = parse_timestamp(request.args.get('until'), 'until')
+    except ExportFilterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    rows = export_rows(since, until, request.args.get('status'), request.args.get('payment_status'))
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(encode_rows(rows, fmt)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=orders.{fmt}'
+    return response
+
+# Admin: sales per item or temple, aggregated from order_items
+@main.route('/api/admin/reports/items', methods=['GET'])
+@admin_required
+def item_sales_report(current_user):
+    """Orders, quantity and revenue grouped by item or temple (admin only)"""
+    group_by = request.args.get('group_by', 'item')
+    if group_by not in REPORT_GROUPS:
+        return jsonify({'success': False, 'message': 'group_by must be item or temple'}), 400
+    try:
+        since = parse_timestamp(request.args.get('since'), 'since')
+        until = parse_timestamp(request.args.get('until'), 'until')
+        temple_id = request.args.get('temple_id', type=int)
+        prasadam_id = request.args.get('prasadam_id', type=int)
+    except ExportFilterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'group_by': group_by,
+        'results': item_sales(group_by, since, until, temple_id, prasadam_id, request.args.get('status'))
+    })
+
+# Admin: stock of a limited item
+@main.route('/api/admin/prasadam/<int:prasadam_id>/stock', methods=['PUT'])
+@admin_required
+def update_stock(current_user, prasadam_id):
+    """Set the units left to reserve; null makes the item unlimited (admin only)"""
+    data = request.get_json(silent=True) or {}
+    stock = data.get('stock')
+    if stock is not None and (not isinstance(stock, int) or isinstance(stock, bool) or stock < 0):
+        return jsonify({'success': False, 'message': 'stock must be a non-negative integer or null'}), 400
+    if not set_stock(prasadam_id, stock):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Prasadam not found'}), 404
+    db.session.commit()
+    return jsonify({'success': True, 'prasadam_id': prasadam_id, 'stock': stock})
+
+# Admin: daily/weekly sales per temple or item from the precomputed aggregates
+@main.route('/api/admin/stats/sales', methods=['GET'])
+@admin_required
+def sales_stats(current_user):
+    """Confirmed orders, quantity and revenue per day or week (admin only)"""
+    period = request.args.get('period', 'day')
+    level = request.args.get('level', 'temple')
+    if period not in STATS_PERIODS or level not in STATS_LEVELS:
+        return jsonify({'success': False, 'message': 'period must be day or week and level temple or item'}), 400
+    try:
+        first_day, last_day = parse_stats_range(request.args.get('since'), request.args.get('until'),
+                                                request.args.get('days', 30))
+    except StatsRangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'period': period,
+        'level': level,
+        'since': first_day.isoformat(),
+        'until': last_day.isoformat(),
+        'results': sales_rollup(first_day, last_day, period, level,
+                                request.args.get('temple_id', type=int), request.args.get('prasadam_id', type=int))
+    })
 
 # Health check endpoint
-@app.route('/api/health', methods=['GET'])
+@main.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
@@ -582,14 +1270,24 @@ def health_check():
         'timestamp': datetime.utcnow().isoformat()
     })
 
+# Metrics endpoint (Prometheus text format)
+@main.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request, latency, DB pool, cache and order metrics for all worker processes"""
+    return current_app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Error handlers
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def not_found(error):
     return jsonify({'success': False, 'message': 'Resource not found'}), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def internal_error(error):
     return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
+app = create_app()
+
 if __name__ == '__main__':
+    with app.app_context():
+        init_database()
     app.run(debug=True, port=5000)
\ No newline at end of file
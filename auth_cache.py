@@ -0,0 +1,107 @@
+# auth_cache.py
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event
+from models import User
+
+# Lightweight view of a verified user, enough for authorization checks
+Principal = namedtuple('Principal', ['id', 'name', 'email', 'is_active'])
+
+
+def principal_from_user(user):
+    return Principal(id=user.id, name=user.name, email=user.email, is_active=bool(user.is_active))
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens -> Principal with a per-entry TTL"""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user = {}      # user_id -> set of tokens
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self._entries) > self.maxsize:
+                self._evict_oldest()
+
+    def get(self, token):
+        """Return the cached Principal for a token, or None if absent or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= now:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token, principal, token_exp=None):
+        """Cache a verified token; the entry never outlives the token's own exp"""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._evict_oldest()
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token of a user"""
+        with self._lock:
+            for token in self._tokens_by_user.pop(user_id, set()):
+                self._entries.pop(token, None)
+
+    def invalidate_token(self, token):
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, token):
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(principal.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[principal.id]
+
+    def _evict_oldest(self):
+        token = next(iter(self._entries))
+        self._remove(token)
+
+
+token_cache = TokenCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user_tokens(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
@@ -0,0 +1,377 @@
+"""Latency and throughput benchmark for the E-Prashadam API routes.
+
+Builds a throwaway SQLite database: seed_database() plus synthetic users,
+catalog items and order history. It then drives the main API routes two
+ways: sequentially through Flask's test client, and concurrently against
+a threaded local WSGI server. For each route it reports p50/p95/p99
+latency, throughput and SQL queries per request.
+
+    python benchmarks/api_bench.py --users 2000 --orders 20000 --items 5000 \\
+        --requests 500 --threads 8 --json results.json
+    python benchmarks/api_bench.py --json new.json --compare results.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'bench-password'
+ROUTES = ['login', 'prasadam', 'create-order', 'verify-payment', 'my-orders']
+
+
+def load_app(database_path):
+    """Import the app against a throwaway database, then create and seed its tables"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database_path
+    os.environ['RATE_LIMIT_DB'] = os.path.join(os.path.dirname(database_path), 'ratelimit.db')
+    os.environ.setdefault('RATE_LIMITING', 'false')  # Benchmarks drive many requests from one IP
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.init_database()
+    return app_module
+
+
+def build_dataset(app_module, users, orders, items, seed):
+    """Bulk-insert synthetic users, prasadam items and order history"""
+    from sqlalchemy import insert
+    from models import db, User, Temple, Prasadam, Order, Payment
+    from passwords import password_hasher
+    from ids import new_order_id, new_payment_order_id
+
+    rng = random.Random(seed)
+    app = app_module.app
+    with app.app_context():
+        password_hash = password_hasher.hash(PASSWORD)
+        db.session.execute(insert(User), [{
+            'name': f'Bench Devotee {i}',
+            'email': f'bench{i}@example.com',
+            'phone': f'90000{i:05d}',
+            'password_hash': password_hash,
+            'address': 'Varanasi, Uttar Pradesh',
+            'is_active': True,
+        } for i in range(users)])
+
+        temple_ids = [t.id for t in Temple.query.all()]
+        db.session.execute(insert(Prasadam), [{
+            'temple_id': rng.choice(temple_ids),
+            'name': f'Bench Prasad {i}',
+            'description': 'Synthetic benchmark item',
+            'price': float(rng.randint(51, 1001)),
+            'available': True,
+        } for i in range(items)])
+        db.session.commit()
+
+        user_ids = [row[0] for row in db.session.query(User.id).filter(User.email.like('bench%'))]
+        catalog = [(p.id, p.name, p.price) for p in Prasadam.query.filter_by(available=True)]
+        start = datetime.utcnow() - timedelta(days=365)
+
+        batch = 5000
+        for offset in range(0, orders, batch):
+            order_rows = []
+            for i in range(offset, min(offset + batch, orders)):
+                lines = [{'id': pid, 'name': name, 'quantity': 1, 'price': price}
+                         for pid, name, price in rng.sample(catalog, rng.randint(1, 4))]
+                order_rows.append({
+                    'order_id': new_order_id(),
+                    'user_id': rng.choice(user_ids),
+                    'user_name': 'Bench Devotee',
+                    'user_email': 'bench@example.com',
+                    'user_phone': '9000000000',
+                    'user_address': 'Varanasi',
+                    'items': lines,
+                    'total_amount': sum(line['price'] for line in lines),
+                    'status': 'confirmed',
+                    'created_at': start + timedelta(seconds=i * 31536000 // max(orders, 1)),
+                })
+            db.session.execute(insert(Order), order_rows)
+            ids = [row[0] for row in db.session.query(Order.id).order_by(Order.id.desc()).limit(len(order_rows))]
+            db.session.execute(insert(Payment), [{
+                'order_id': order_id,
+                'payment_order_id': new_payment_order_id(),
+                'amount': 0.0,
+                'status': 'completed',
+            } for order_id in ids])
+            db.session.commit()
+
+        return user_ids, [pid for pid, _, _ in catalog]
+
+
+class QueryCounter:
+    """Counts SQL statements per request; must be attached before the first request"""
+
+    def __init__(self, app_module):
+        from sqlalchemy import event
+        from models import db
+
+        self.local = threading.local()
+        self.per_request = []
+        self._lock = threading.Lock()
+        app = app_module.app
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        app.before_request(self._reset)
+        app.after_request(self._record)
+
+    def _on_execute(self, *args):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def _reset(self):
+        self.local.count = 0
+
+    def _record(self, response):
+        with self._lock:
+            self.per_request.append(getattr(self.local, 'count', 0))
+        return response
+
+    def take(self):
+        """Per-request counts recorded since the last call"""
+        with self._lock:
+            counts, self.per_request = self.per_request, []
+        return counts
+
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+
+    def pct(p):
+        return round(latencies[min(count - 1, int(count * p))] * 1000, 3) if count else None
+
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3) if count else None,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+class Workload:
+    """Request factories for each benchmarked route"""
+
+    def __init__(self, user_ids, item_ids, seed):
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.tokens = {}
+        self.pending_payments = []
+        self.pending_lock = threading.Lock()
+
+    def pick(self, population, k=None):
+        with self.rng_lock:
+            return self.rng.sample(population, k) if k else self.rng.choice(population)
+
+    def request(self, route):
+        """Return (method, path, body, token), or None if the route has nothing to act on"""
+        if route == 'login':
+            user_index = self.pick(range(len(self.user_ids)))
+            return 'POST', '/api/auth/login', {'email': f'bench{user_index}@example.com', 'password': PASSWORD}, None
+
+        user_id, token = self.pick(list(self.tokens.items()))
+        if route == 'prasadam':
+            return 'GET', '/api/prasadam', None, token
+        if route == 'my-orders':
+            return 'GET', '/api/my-orders', None, token
+        if route == 'create-order':
+            items = [{'id': item_id, 'quantity': 1} for item_id in self.pick(self.item_ids, 3)]
+            return 'POST', '/api/create-order', {
+                'user_name': 'Bench Devotee', 'user_email': 'bench@example.com',
+                'user_phone': '9000000000', 'user_address': 'Varanasi', 'items': items,
+            }, token
+        if route == 'verify-payment':
+            with self.pending_lock:
+                if not self.pending_payments:
+                    return None  # Every create-order so far failed
+                token, payment_order_id = self.pending_payments.pop()
+            return 'POST', '/api/verify-payment', {'payment_order_id': payment_order_id,
+                                                   'payment_method': 'card'}, token
+        raise ValueError(route)
+
+    def record(self, route, token, response_body):
+        if route == 'create-order' and response_body and response_body.get('success'):
+            with self.pending_lock:
+                self.pending_payments.append((token, response_body['payment_order_id']))
+
+
+def login_users(app_module, workload, sessions):
+    client = app_module.app.test_client()
+    for i in range(min(sessions, len(workload.user_ids))):
+        response = client.post('/api/auth/login', json={'email': f'bench{i}@example.com', 'password': PASSWORD})
+        workload.tokens[workload.user_ids[i]] = response.json['token']
+
+
+def run_test_client(app_module, workload, counter, requests_per_route):
+    client = app_module.app.test_client()
+    results = {}
+    for route in ROUTES:
+        latencies, errors = [], 0
+        counter.take()
+        started = time.perf_counter()
+        for _ in range(requests_per_route):
+            spec = workload.request(route)
+            if spec is None:
+                errors += 1
+                continue
+            method, path, body, token = spec
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+            workload.record(route, token, response.get_json(silent=True))
+        results[route] = summarize(latencies, counter.take(), errors, time.perf_counter() - started)
+    return results
+
+
+def run_server(app_module, workload, counter, requests_per_route, threads):
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No per-request access log
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    port = server.server_port
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    local = threading.local()
+
+    def call(route):
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        spec = workload.request(route)
+        if spec is None:
+            return None, True
+        method, path, body, token = spec
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        start = time.perf_counter()
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+        elapsed = time.perf_counter() - start
+        if response.status < 400:
+            workload.record(route, token, json.loads(payload) if route == 'create-order' else None)
+        return elapsed, response.status >= 400
+
+    results = {}
+    try:
+        for route in ROUTES:
+            counter.take()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes = list(pool.map(lambda _: call(route), range(requests_per_route)))
+            wall = time.perf_counter() - started
+            results[route] = summarize([o[0] for o in outcomes if o[0] is not None], counter.take(),
+                                       sum(1 for o in outcomes if o[1]), wall)
+    finally:
+        server.shutdown()
+    return results
+
+
+def print_results(title, results):
+    print(f'\n{title}')
+    print(f"{'route':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}{'errors':>8}")
+    for route, r in results.items():
+        if not r['requests']:
+            print(f"{route:<16}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{'-':>9}{r['errors']:>8}")
+            continue
+        print(f"{route:<16}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['throughput_rps']:>10.1f}{r['queries_per_request']:>9.2f}{r['errors']:>8}")
+
+
+def print_comparison(current, baseline):
+    print(f"\nCompared with {baseline['meta'].get('git_revision', 'baseline')}")
+    for mode, routes in current['results'].items():
+        for route, r in routes.items():
+            old = baseline.get('results', {}).get(mode, {}).get(route)
+            if not old or not r['requests'] or not old.get('requests'):
+                continue
+            p95 = (r['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+            rps = (r['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100 \
+                if old['throughput_rps'] else 0
+            print(f"{mode:<12}{route:<16} p95 {p95:+7.1f}%   throughput {rps:+7.1f}%   "
+                  f"queries {old['queries_per_request']} -> {r['queries_per_request']}")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--items', type=int, default=2000, help='synthetic prasadam items on top of the seed')
+    parser.add_argument('--sessions', type=int, default=50, help='logged-in users issuing requests')
+    parser.add_argument('--requests', type=int, default=300, help='requests per route and mode')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent clients in server mode')
+    parser.add_argument('--mode', choices=['all', 'test-client', 'server'], default='all')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write machine-readable results to this file')
+    parser.add_argument('--compare', help='earlier --json output to compare against')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='eprashadam-bench-') as workdir:
+        started = time.perf_counter()
+        app_module = load_app(os.path.join(workdir, 'bench.db'))
+        user_ids, item_ids = build_dataset(app_module, args.users, args.orders, args.items, args.seed)
+        print(f'Dataset ready in {time.perf_counter() - started:.1f}s: {len(user_ids)} users, '
+              f'{args.orders} orders, {len(item_ids)} catalog items')
+
+        counter = QueryCounter(app_module)
+        workload = Workload(user_ids, item_ids, args.seed)
+        login_users(app_module, workload, args.sessions)
+        counter.take()
+
+        report = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'args': vars(args),
+            },
+            'results': {},
+        }
+        if args.mode in ('all', 'test-client'):
+            report['results']['test_client'] = run_test_client(app_module, workload, counter, args.requests)
+            print_results('Flask test client (sequential)', report['results']['test_client'])
+        if args.mode in ('all', 'server'):
+            report['results']['server'] = run_server(app_module, workload, counter, args.requests, args.threads)
+            print_results(f'Threaded WSGI server ({args.threads} clients)', report['results']['server'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults written to {args.json}')
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Per-process login throughput for the password hashing settings.
+
+Measures the cost of one password verification and how many verifications
+per second one worker process sustains through the hashing pool, so the
+KDF cost can be sized against the expected peak login rate:
+
+    python benchmarks/login_throughput.py --scheme scrypt --scrypt-n 16384 --workers 4
+    python benchmarks/login_throughput.py --peak-logins 50 --json results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher  # noqa: E402
+
+
+def measure(hasher, password, stored, logins, clients):
+    """Run `logins` verifications from `clients` concurrent callers"""
+    latencies = []
+
+    def login(_):
+        start = time.perf_counter()
+        valid, _ = hasher.check_in_pool(password, stored)
+        latencies.append(time.perf_counter() - start)
+        assert valid
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as callers:
+        list(callers.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'logins': logins,
+        'clients': clients,
+        'elapsed_s': round(elapsed, 3),
+        'logins_per_s': round(logins / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scheme', default='scrypt', choices=['scrypt', 'pbkdf2_sha256'])
+    parser.add_argument('--scrypt-n', type=int, default=2 ** 14)
+    parser.add_argument('--scrypt-r', type=int, default=8)
+    parser.add_argument('--pbkdf2-iterations', type=int, default=600000)
+    parser.add_argument('--workers', type=int, default=4, help='password hashing pool size')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent login requests')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--peak-logins', type=float, help='target logins/s per process')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(scheme=args.scheme, scrypt_n=args.scrypt_n, scrypt_r=args.scrypt_r,
+                            pbkdf2_iterations=args.pbkdf2_iterations, workers=args.workers)
+    password = 'prasadam123'
+    stored = hasher.hash(password)
+
+    single = []
+    for _ in range(10):
+        start = time.perf_counter()
+        hasher.verify(password, stored)
+        single.append(time.perf_counter() - start)
+
+    result = {
+        'scheme': args.scheme,
+        'hash_prefix': stored.rsplit('$', 2)[0],
+        'workers': args.workers,
+        'cpu_count': os.cpu_count(),
+        'single_verify_ms': round(statistics.median(single) * 1000, 2),
+        'throughput': measure(hasher, password, stored, args.logins, args.clients),
+    }
+
+    throughput = result['throughput']
+    print(f"{result['hash_prefix']}  workers={args.workers}  cpus={result['cpu_count']}")
+    print(f"  single verify      {result['single_verify_ms']:.2f} ms")
+    print(f"  throughput         {throughput['logins_per_s']:.1f} logins/s per process")
+    print(f"  latency p50/p95    {throughput['p50_ms']:.1f} / {throughput['p95_ms']:.1f} ms "
+          f"({args.clients} concurrent clients)")
+    if args.peak_logins:
+        processes = args.peak_logins / throughput['logins_per_s']
+        result['processes_for_peak'] = round(processes, 2)
+        print(f"  peak {args.peak_logins:g} logins/s needs {processes:.2f} worker processes")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Serialization time and bytes on the wire for the largest API responses.
+
+Builds a throwaway dataset (see api_bench.py), fetches each route once to
+get its payload, then reports per route:
+
+  - encode time with Flask's stdlib provider and with orjson (if installed)
+  - body size as identity, gzip and deflate
+  - end-to-end latency through the test client without and with
+    Accept-Encoding: gzip, which for catalog routes is served from the
+    precompressed bodies kept on the catalog snapshot
+
+    python benchmarks/serialization_bench.py --items 5000 --orders 20000 --repeat 200
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api_bench import PASSWORD, load_app, build_dataset  # noqa: E402
+
+ROUTES = {
+    'temples': '/api/temples',
+    'prasadam': '/api/prasadam',
+    'my-orders': '/api/my-orders?limit=100',
+    'search': '/api/search?q=pr&limit=50',
+}
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--items', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    from json_provider import FastJSONProvider, orjson
+
+    with tempfile.TemporaryDirectory(prefix='eprashadam-json-') as workdir:
+        app_module = load_app(os.path.join(workdir, 'bench.db'))
+        build_dataset(app_module, args.users, args.orders, args.items, args.seed)
+        app = app_module.app
+        client = app.test_client()
+        token = client.post('/api/auth/login', json={'email': 'bench0@example.com', 'password': PASSWORD}).json['token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        stdlib = DefaultJSONProvider(app)
+        fast = FastJSONProvider(app, backend='orjson') if orjson is not None else None
+        level = app.config['COMPRESS_LEVEL']
+        print(f"{'route':<11}{'stdlib ms':>10}{'orjson ms':>10}{'identity B':>12}{'gzip B':>9}{'deflate B':>10}"
+              f"{'plain ms':>10}{'gzip ms':>9}")
+        for route, path in ROUTES.items():
+            response = client.get(path, headers=headers)
+            payload = json.loads(response.data)
+            body = stdlib.dumps(payload, separators=(',', ':')).encode()
+
+            stdlib_ms = median_ms(lambda: stdlib.dumps(payload, separators=(',', ':')), args.repeat)
+            orjson_ms = median_ms(lambda: fast.dumps_bytes(payload), args.repeat) if fast else float('nan')
+            gzip_size = len(gzip.compress(body, compresslevel=level, mtime=0))
+            deflate_size = len(zlib.compress(body, level))
+            plain_ms = median_ms(lambda: client.get(path, headers=headers), args.repeat)
+            gzip_ms = median_ms(lambda: client.get(path, headers={**headers, 'Accept-Encoding': 'gzip'}),
+                                args.repeat)
+            print(f'{route:<11}{stdlib_ms:>10.3f}{orjson_ms:>10.3f}{len(body):>12}{gzip_size:>9}{deflate_size:>10}'
+                  f'{plain_ms:>10.3f}{gzip_ms:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Worker startup benchmark for the E-Prashadam app.
+
+Starts fresh Python processes that each import the app module (which builds
+the app with create_app()) the way a gunicorn worker does, and reports how
+long that takes and how many database connections and SQL statements it
+issued. Boot must stay free of database work; schema creation and seeding
+belong to `flask --app app init-db`.
+
+    python benchmarks/startup_time.py --runs 10 --target-ms 800
+
+Exits non-zero when the median boot time misses the target or any SQL ran.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside each child process
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+counts = {'connections': 0, 'statements': 0}
+event.listen(Pool, 'connect', lambda *args: counts.__setitem__('connections', counts['connections'] + 1))
+event.listen(Engine, 'before_cursor_execute',
+             lambda *args: counts.__setitem__('statements', counts['statements'] + 1))
+imported = time.perf_counter()
+import app
+booted = time.perf_counter()
+factory_started = time.perf_counter()
+app.create_app()
+factory_ms = (time.perf_counter() - factory_started) * 1000
+json.dump({'boot_ms': (booted - started) * 1000, 'import_ms': (booted - imported) * 1000,
+           'factory_ms': factory_ms, **counts}, sys.stdout)
+'''
+
+
+def run_once(env):
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--target-ms', type=float, default=800,
+                        help='maximum acceptable median time to import and build the app')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # A database path that does not exist: any boot-time query would create it
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(workdir, 'startup.db'))
+        run_once(env)  # Warm the bytecode and filesystem caches
+        results = [run_once(env) for _ in range(args.runs)]
+        database_created = os.path.exists(os.path.join(workdir, 'startup.db'))
+
+    boot = [r['boot_ms'] for r in results]
+    print(f"runs: {args.runs}")
+    print(f"process boot (import app):  median {statistics.median(boot):.1f} ms, max {max(boot):.1f} ms")
+    print(f"create_app() alone:         median {statistics.median(r['factory_ms'] for r in results):.2f} ms")
+    connections = max(r['connections'] for r in results)
+    statements = max(r['statements'] for r in results)
+    print(f"DB connections at boot: {connections}, SQL statements at boot: {statements}")
+
+    failures = []
+    if statistics.median(boot) > args.target_ms:
+        failures.append(f'median boot {statistics.median(boot):.1f} ms exceeds target {args.target_ms:.0f} ms')
+    if connections or statements or database_created:
+        failures.append('worker boot touched the database')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print(f'OK: within {args.target_ms:.0f} ms target and no database work at boot')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
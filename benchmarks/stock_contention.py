@@ -0,0 +1,190 @@
+"""Concurrency stress test for limited-stock reservations.
+
+Builds a throwaway SQLite database, gives a few prasadam items a small
+stock and lets many concurrent clients race to order them through a
+threaded local WSGI server, like a festival opening. It then checks that
+nothing was oversold: the stock taken equals the quantity on the orders
+that succeeded, and never exceeds what was on sale. Finally half of the
+orders are paid and the rest time out, and the stock must come back to
+exactly what the unpaid orders held.
+
+    python benchmarks/stock_contention.py --stock 200 --requests 3000 --threads 32
+
+Exits with status 1 when an invariant fails.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api_bench import PASSWORD, load_app, summarize  # noqa: E402
+
+
+def prepare(app_module, users, limited_items, stock):
+    """Bench users plus `limited_items` seeded items with `stock` units each -> (user emails, item ids)"""
+    from sqlalchemy import insert
+    from models import db, User, Prasadam
+    from passwords import password_hasher
+    from stock import set_stock
+
+    with app_module.app.app_context():
+        password_hash = password_hasher.hash(PASSWORD)
+        db.session.execute(insert(User), [{
+            'name': f'Stress Devotee {i}',
+            'email': f'stress{i}@example.com',
+            'phone': f'91000{i:05d}',
+            'password_hash': password_hash,
+            'address': 'Puri, Odisha',
+            'is_active': True,
+        } for i in range(users)])
+        item_ids = [p.id for p in Prasadam.query.filter_by(available=True).order_by(Prasadam.id).limit(limited_items)]
+        for item_id in item_ids:
+            set_stock(item_id, stock)
+        db.session.commit()
+    return [f'stress{i}@example.com' for i in range(users)], item_ids
+
+
+def stock_levels(app_module, item_ids):
+    from models import db, Prasadam
+    with app_module.app.app_context():
+        rows = db.session.query(Prasadam.id, Prasadam.stock).filter(Prasadam.id.in_(item_ids)).all()
+        db.session.remove()
+    return dict(rows)
+
+
+def run(app_module, tokens, item_ids, requests, threads, max_quantity, seed):
+    """Fire create-order requests for the limited items -> (outcomes, elapsed)"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    local = threading.local()
+    rng = random.Random(seed)
+    plans = []
+    for _ in range(requests):
+        wanted = rng.sample(item_ids, rng.randint(1, min(2, len(item_ids))))
+        plans.append((rng.choice(tokens), {item_id: rng.randint(1, max_quantity) for item_id in wanted}))
+
+    def call(plan):
+        token, wanted = plan
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        body = {
+            'user_name': 'Stress Devotee', 'user_email': 'stress@example.com',
+            'user_phone': '9100000000', 'user_address': 'Puri',
+            'items': [{'id': item_id, 'quantity': quantity} for item_id, quantity in wanted.items()],
+        }
+        start = time.perf_counter()
+        connection.request('POST', '/api/create-order', body=json.dumps(body),
+                           headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'})
+        response = connection.getresponse()
+        payload = json.loads(response.read())
+        return time.perf_counter() - start, response.status, wanted, payload
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            outcomes = list(pool.map(call, plans))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+    return outcomes, elapsed
+
+
+def settle(app_module, order_ids):
+    """Pay the first half of the orders, then let the rest time out -> order ids paid"""
+    from models import db
+    from stock import commit_reservations, release_expired_reservations
+
+    paid = order_ids[:len(order_ids) // 2]
+    with app_module.app.app_context():
+        for order_id in paid:
+            commit_reservations(order_id)
+        db.session.commit()
+        later = datetime.utcnow() + timedelta(seconds=app_module.app.config['STOCK_RESERVATION_TTL'] + 1)
+        while release_expired_reservations(now=later):
+            db.session.commit()
+        db.session.commit()
+    return set(paid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stock', type=int, default=200, help='units of each limited item')
+    parser.add_argument('--items', type=int, default=2, help='limited items buyers compete for')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--threads', type=int, default=32, help='concurrent buyers')
+    parser.add_argument('--max-quantity', type=int, default=3, help='largest quantity of one item per order')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='eprashadam-stock-') as workdir:
+        app_module = load_app(os.path.join(workdir, 'stress.db'))
+        emails, item_ids = prepare(app_module, args.users, args.items, args.stock)
+        client = app_module.app.test_client()
+        tokens = [client.post('/api/auth/login', json={'email': email, 'password': PASSWORD}).json['token']
+                  for email in emails]
+
+        outcomes, elapsed = run(app_module, tokens, item_ids, args.requests, args.threads,
+                                args.max_quantity, args.seed)
+        statuses = Counter(status for _, status, _, _ in outcomes)
+        sold = Counter()
+        orders = []
+        for _, status, wanted, payload in outcomes:
+            if status == 200:
+                sold.update(wanted)
+                orders.append((payload['order_id'], wanted))
+        after_rush = stock_levels(app_module, item_ids)
+
+        report = summarize([o[0] for o in outcomes], [], sum(1 for s in statuses if s not in (200, 409)), elapsed)
+        print(f"{args.requests} orders from {args.threads} concurrent buyers in {elapsed:.2f}s "
+              f"({report['throughput_rps']} req/s, p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms)")
+        print('Responses: ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items())))
+
+        failures = []
+        for item_id in item_ids:
+            left = after_rush[item_id]
+            print(f'Item {item_id}: {sold[item_id]} of {args.stock} sold, {left} left')
+            if left < 0 or sold[item_id] + left != args.stock:
+                failures.append(f'item {item_id}: sold {sold[item_id]} + left {left} != stock {args.stock}')
+        unexpected = {status: count for status, count in statuses.items() if status not in (200, 409)}
+        if unexpected:
+            failures.append(f'unexpected responses {unexpected}')
+
+        paid = settle(app_module, [order_id for order_id, _ in orders])
+        kept = Counter()
+        for order_id, wanted in orders:
+            if order_id in paid:
+                kept.update(wanted)
+        after_timeout = stock_levels(app_module, item_ids)
+        for item_id in item_ids:
+            print(f'Item {item_id}: {kept[item_id]} paid, {after_timeout[item_id]} back on sale after the timeout')
+            if after_timeout[item_id] != args.stock - kept[item_id]:
+                failures.append(f'item {item_id}: {after_timeout[item_id]} on sale after timeout, '
+                                f'expected {args.stock - kept[item_id]}')
+
+    if failures:
+        print('FAILED\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('OK: no overselling, and timed-out reservations returned exactly their stock')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# catalog.py
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event
+from models import db, Temple, Prasadam, CatalogState
+from search import SearchIndex
+from compression import compress
+
+# Models whose changes invalidate the catalog snapshot
+CATALOG_MODELS = (Temple, Prasadam)
+
+# Row id of the single catalog_state record
+CATALOG_STATE_ID = 1
+
+
+class CatalogSnapshot:
+    """Serialized temples and prasadam for one catalog version"""
+
+    def __init__(self, version, updated_at, temples, prasadam):
+        self.version = version
+        self.updated_at = updated_at
+        self.temples = temples
+        self.prasadam = prasadam
+        self.temple_ids = {t['id'] for t in temples}
+        self._lock = threading.Lock()
+        self._temple_prasadam = {}
+        self._search_index = None
+        self._bodies = {}
+
+    def temple_prasadam(self, temple_id):
+        """Available items of one temple, loaded on first use for this version"""
+        items = self._temple_prasadam.get(temple_id)
+        if items is None:
+            items = load_temple_prasadam(temple_id)
+            with self._lock:
+                self._temple_prasadam[temple_id] = items
+        return items
+
+    def body(self, name, payload, encoding=None):
+        """JSON body of a catalog resource, optionally compressed, encoded once for this version"""
+        key = (name, encoding)
+        body = self._bodies.get(key)
+        if body is None:
+            if encoding is None:
+                body = current_app.json.dumps_bytes(payload()) + b'\n'
+            else:
+                body = compress(self.body(name, payload), encoding, current_app.config['COMPRESS_LEVEL'])
+            with self._lock:
+                self._bodies[key] = body
+        return body
+
+    def search_index(self):
+        """Inverted index over this version's temples and available items, built on first search"""
+        if self._search_index is None:
+            with self._lock:
+                if self._search_index is None:
+                    self._search_index = SearchIndex(self.temples, self.prasadam)
+        return self._search_index
+
+
+class CatalogCache:
+    """Process-wide catalog snapshot, rebuilt only when the catalog version changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        """Return the current snapshot, rebuilding it if the catalog changed"""
+        snapshot = self._snapshot
+        interval = current_app.config.get('CATALOG_VERSION_CHECK_INTERVAL', 5)
+        if snapshot is not None and time.monotonic() - self._checked_at < interval:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            version, updated_at = read_catalog_version()
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = build_snapshot(version, updated_at)
+                self._snapshot = snapshot
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        """Force the next read to re-check the stored catalog version"""
+        self._checked_at = 0.0
+
+
+catalog_cache = CatalogCache()
+
+
+def get_catalog():
+    return catalog_cache.get()
+
+
+def read_catalog_version():
+    """Read (version, updated_at) from catalog_state"""
+    state = db.session.get(CatalogState, CATALOG_STATE_ID)
+    if not state:
+        return 0, None
+    return state.version, state.updated_at
+
+
+def bump_catalog_version(connection):
+    """Increment the stored catalog version on the given connection"""
+    table = CatalogState.__table__
+    now = datetime.utcnow()
+    result = connection.execute(
+        table.update()
+        .where(table.c.id == CATALOG_STATE_ID)
+        .values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=CATALOG_STATE_ID, version=1, updated_at=now))
+
+
+def ensure_catalog_state():
+    """Create the catalog_state row for databases that predate it"""
+    if not db.session.get(CatalogState, CATALOG_STATE_ID):
+        bump_catalog_version(db.session.connection())
+        db.session.commit()
+
+
+def build_snapshot(version, updated_at):
+    """Load the whole catalog: one query for temples, one joined query for prasadam"""
+    temples = Temple.query.order_by(Temple.id).all()
+    rows = db.session.query(Prasadam, Temple)\
+        .join(Temple, Prasadam.temple_id == Temple.id)\
+        .filter(Prasadam.available == True)\
+        .order_by(Prasadam.id)\
+        .all()
+
+    return CatalogSnapshot(
+        version=version,
+        updated_at=updated_at,
+        temples=[{
+            'id': t.id,
+            'name': t.name,
+            'location': t.location,
+            'type': t.type,
+            'description': t.description
+        } for t in temples],
+        prasadam=[serialize_prasadam(p, t) for p, t in rows]
+    )
+
+
+def load_temple_prasadam(temple_id):
+    """Query one temple's available items through ix_prasadam_temple_available"""
+    temple = db.session.get(Temple, temple_id)
+    if not temple:
+        return []
+    items = Prasadam.query.with_parent(temple, Temple.prasadam_items)\
+        .filter_by(available=True)\
+        .order_by(Prasadam.id)\
+        .all()
+    return [serialize_prasadam(p, temple) for p in items]
+
+
+def serialize_prasadam(p, t):
+    return {
+        'id': p.id,
+        'name': p.name,
+        'description': p.description,
+        'price': p.price,
+        'temple_name': t.name,
+        'temple_type': t.type
+    }
+
+
+def _touches_catalog(session):
+    return any(isinstance(obj, CATALOG_MODELS)
+               for obj in (*session.new, *session.dirty, *session.deleted))
+
+
+def mark_catalog_changed(session):
+    """Bump the version in the session's transaction and invalidate the cache on commit.
+
+    Flushed ORM changes do this automatically; bulk statements executed through
+    the session bypass the flush and must call it themselves.
+    """
+    bump_catalog_version(session.connection())
+    session.info['catalog_changed'] = True
+
+
+@event.listens_for(db.session, 'after_flush')
+def _bump_on_catalog_flush(session, flush_context):
+    # session.new/dirty/deleted still hold the pre-flush state here
+    if _touches_catalog(session):
+        mark_catalog_changed(session)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('catalog_changed', False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _clear_on_rollback(session):
+    session.info.pop('catalog_changed', None)
@@ -0,0 +1,301 @@
+# catalog_io.py
+import csv
+import json
+import os
+import sys
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, update
+from models import db, Temple, Prasadam
+from catalog import mark_catalog_changed
+
+# One row per prasadam item, carrying its temple; a row without `name` describes a temple only
+CATALOG_FIELDS = ['temple_name', 'temple_location', 'temple_type', 'temple_description',
+                  'name', 'description', 'price', 'available']
+
+TEMPLE_COLUMNS = {'temple_location': 'location', 'temple_type': 'type', 'temple_description': 'description'}
+ITEM_COLUMNS = ('description', 'price', 'available')
+
+DEFAULT_BATCH_SIZE = 500
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+FALSE_VALUES = ('0', 'false', 'no', 'n')
+
+
+class CatalogImportError(ValueError):
+    """Raised for a malformed catalog row; carries the line number"""
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.temples_created = 0
+        self.temples_updated = 0
+        self.items_created = 0
+        self.items_updated = 0
+        self.items_unchanged = 0
+
+    def __str__(self):
+        return (f'{self.rows} rows: {self.temples_created} temples created, {self.temples_updated} updated; '
+                f'{self.items_created} prasadam created, {self.items_updated} updated, '
+                f'{self.items_unchanged} unchanged')
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise click.UsageError(f'Cannot tell the format of {path}; pass --format csv or --format jsonl')
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, row dict) from a CSV or JSON Lines stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise CatalogImportError(f'line {line_number}: invalid JSON ({e})')
+        if not isinstance(row, dict):
+            raise CatalogImportError(f'line {line_number}: expected a JSON object')
+        yield line_number, row
+
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _parse_available(value, line_number):
+    if value is None or isinstance(value, bool):
+        return True if value is None else value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES or text == '':
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise CatalogImportError(f'line {line_number}: available must be true or false, got {value!r}')
+
+
+def parse_row(line_number, row):
+    """Validate one row -> (temple_name, temple fields, item fields or None)"""
+    temple_name = _text(row, 'temple_name')
+    if not temple_name:
+        raise CatalogImportError(f'line {line_number}: temple_name is required')
+    temple = {column: _text(row, key) for key, column in TEMPLE_COLUMNS.items() if _text(row, key) is not None}
+
+    name = _text(row, 'name')
+    if not name:
+        return temple_name, temple, None
+    try:
+        price = float(row.get('price'))
+    except (TypeError, ValueError):
+        raise CatalogImportError(f'line {line_number}: price must be a number for {name!r}')
+    if price < 0:
+        raise CatalogImportError(f'line {line_number}: price must not be negative for {name!r}')
+    item = {
+        'name': name,
+        'description': _text(row, 'description'),
+        'price': price,
+        'available': _parse_available(row.get('available'), line_number),
+    }
+    return temple_name, temple, item
+
+
+class CatalogImporter:
+    """Upsert catalog rows in batches.
+
+    Temples are matched by name and prasadam by (temple, name). Every batch
+    resolves existing rows with one query, writes new rows with one bulk
+    INSERT and changed rows with one bulk UPDATE, and commits on its own so
+    the SQLite write lock is held for one batch at a time.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.stats = ImportStats()
+        # name -> {'id', 'location', 'type', 'description'}
+        self.temples = {t.name: {'id': t.id, 'location': t.location, 'type': t.type,
+                                 'description': t.description}
+                        for t in db.session.query(Temple.id, Temple.name, Temple.location,
+                                                  Temple.type, Temple.description)}
+        self._loaded_items = set()  # temple ids whose items are in self.items
+        self.items = {}             # (temple_id, name) -> {'id', 'description', 'price', 'available'}
+
+    def run(self, rows):
+        batch = []
+        for line_number, row in rows:
+            batch.append(parse_row(line_number, row))
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+        return self.stats
+
+    def write_batch(self, batch):
+        self.stats.rows += len(batch)
+        try:
+            changed = self._upsert_temples(batch)
+            changed = self._upsert_items(batch) or changed
+            if changed:
+                mark_catalog_changed(db.session)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _upsert_temples(self, batch):
+        new_temples, updates = {}, {}
+        for temple_name, fields, _ in batch:
+            existing = self.temples.get(temple_name)
+            if existing is None:
+                merged = new_temples.setdefault(temple_name, {'name': temple_name})
+                merged.update(fields)
+            elif any(existing[k] != v for k, v in fields.items()):
+                existing.update(fields)
+                updates[existing['id']] = {'id': existing['id'], **fields}
+
+        if new_temples:
+            for values in new_temples.values():
+                if not values.get('location') or not values.get('type'):
+                    raise CatalogImportError(f"New temple {values['name']!r} needs temple_location and temple_type")
+            created = db.session.execute(insert(Temple).returning(Temple.id, Temple.name),
+                                         list(new_temples.values()))
+            for temple_id, temple_name in created:
+                values = new_temples[temple_name]
+                self.temples[temple_name] = {'id': temple_id, 'location': values['location'],
+                                             'type': values['type'], 'description': values.get('description')}
+                self._loaded_items.add(temple_id)  # Nothing to load for a brand-new temple
+            self.stats.temples_created += len(new_temples)
+        if updates:
+            db.session.execute(update(Temple), list(updates.values()))
+            self.stats.temples_updated += len(updates)
+        return bool(new_temples or updates)
+
+    def _load_items(self, temple_ids):
+        missing = [temple_id for temple_id in temple_ids if temple_id not in self._loaded_items]
+        if not missing:
+            return
+        rows = db.session.query(Prasadam.id, Prasadam.temple_id, Prasadam.name, Prasadam.description,
+                                Prasadam.price, Prasadam.available)\
+            .filter(Prasadam.temple_id.in_(missing))
+        for item_id, temple_id, name, description, price, available in rows:
+            self.items[(temple_id, name)] = {'id': item_id, 'description': description,
+                                             'price': price, 'available': available}
+        self._loaded_items.update(missing)
+
+    def _upsert_items(self, batch):
+        self._load_items({self.temples[temple_name]['id'] for temple_name, _, item in batch if item})
+
+        new_items, updates = {}, {}
+        for temple_name, _, item in batch:
+            if item is None:
+                continue
+            temple_id = self.temples[temple_name]['id']
+            key = (temple_id, item['name'])
+            existing = self.items.get(key)
+            if existing is None:
+                new_items[key] = {'temple_id': temple_id, **item}
+                continue
+            values = {column: item[column] for column in ITEM_COLUMNS}
+            if item['description'] is None:
+                del values['description']  # Keep the stored description when the row has none
+            if any(existing[k] != v for k, v in values.items()):
+                existing.update(values)
+                updates[existing['id']] = {'id': existing['id'], **values}
+            else:
+                self.stats.items_unchanged += 1
+
+        if new_items:
+            created = db.session.execute(
+                insert(Prasadam).returning(Prasadam.id, Prasadam.temple_id, Prasadam.name),
+                list(new_items.values())
+            )
+            for item_id, temple_id, name in created:
+                values = new_items[(temple_id, name)]
+                self.items[(temple_id, name)] = {'id': item_id, 'description': values['description'],
+                                                 'price': values['price'], 'available': values['available']}
+            self.stats.items_created += len(new_items)
+        if updates:
+            db.session.execute(update(Prasadam), list(updates.values()))
+            self.stats.items_updated += len(updates)
+        return bool(new_items or updates)
+
+
+def import_catalog(stream, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    return CatalogImporter(batch_size).run(read_rows(stream, fmt))
+
+
+def export_rows(batch_size=DEFAULT_BATCH_SIZE):
+    """Yield every temple and prasadam item (available or not) in CATALOG_FIELDS form"""
+    query = db.session.query(Temple.name, Temple.location, Temple.type, Temple.description,
+                             Prasadam.name, Prasadam.description, Prasadam.price, Prasadam.available)\
+        .outerjoin(Prasadam, Prasadam.temple_id == Temple.id)\
+        .order_by(Temple.id, Prasadam.id)\
+        .execution_options(yield_per=batch_size)
+    for row in query:
+        yield dict(zip(CATALOG_FIELDS, row))
+
+
+def export_catalog(stream, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        for row in export_rows(batch_size):
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in export_rows(batch_size):
+            stream.write(json.dumps(row) + '\n')
+            count += 1
+    return count
+
+
+@click.command('import-catalog')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows per transaction')
+@with_appcontext
+def import_catalog_command(path, fmt, batch_size):
+    """Create or update temples and prasadam from a CSV or JSON Lines file ('-' for stdin)"""
+    fmt = detect_format(path, fmt) if path != '-' else (fmt or 'jsonl')
+    try:
+        if path == '-':
+            stats = import_catalog(sys.stdin, fmt, batch_size)
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                stats = import_catalog(f, fmt, batch_size)
+    except CatalogImportError as e:
+        raise click.ClickException(f'Import stopped, earlier batches were kept: {e}')
+    click.echo(f'Imported {stats}')
+
+
+@click.command('export-catalog')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+@with_appcontext
+def export_catalog_command(path, fmt):
+    """Write every temple and prasadam item to a CSV or JSON Lines file ('-' for stdout)"""
+    if path == '-':
+        export_catalog(sys.stdout, fmt or 'jsonl')
+        return
+    fmt = detect_format(path, fmt)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        count = export_catalog(f, fmt)
+    os.replace(tmp_path, path)
+    click.echo(f'Exported {count} rows to {path}')
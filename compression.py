@@ -0,0 +1,60 @@
+# compression.py
+import gzip
+import zlib
+from flask import request
+
+# Content-Encodings we produce, in order of preference at equal quality
+ENCODINGS = ('gzip', 'deflate')
+
+# Only text formats shrink enough to be worth it
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/css', 'text/plain',
+                          'application/javascript', 'text/javascript', 'text/csv')
+
+
+def negotiate_encoding():
+    """Best encoding the client accepts (Accept-Encoding, honouring q=0), or None"""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data, encoding, level):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(data, level)
+    raise ValueError(f'Unsupported encoding {encoding}')
+
+
+def mark_encoded(response, encoding):
+    """Headers for a body already compressed with encoding"""
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The compressed bytes are a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_compression(app):
+    """Compress responses of at least COMPRESS_MIN_SIZE bytes for clients that accept it"""
+    if not app.config['COMPRESS_RESPONSES']:
+        return
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    level = app.config['COMPRESS_LEVEL']
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding, level))
+        mark_encoded(response, encoding)
+        return response
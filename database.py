@@ -0,0 +1,114 @@
+# database.py
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from models import db
+
+
+def ensure_indexes():
+    """Create indexes declared on the models that are missing from existing tables"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                print(f"Created index {index.name}")
+
+
+def ensure_columns():
+    """Add nullable columns declared on the models that are missing from existing tables"""
+    inspector = inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} to an existing table")
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'))
+            print(f"Added column {table.name}.{column.name}")
+
+
+# SQLite pragmas for each database profile, applied to every new connection
+SQLITE_PROFILES = {
+    'development': {},
+    'production': {
+        'journal_mode': 'WAL',      # Readers no longer block behind a writer
+        'synchronous': 'NORMAL',    # fsync at checkpoints instead of every commit (safe with WAL)
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def _in_memory_sqlite(url):
+    # sqlite://, sqlite:///:memory: and file::memory:/mode=memory URIs
+    database = url.database or ''
+    return database in ('', ':memory:') or database.startswith('file::memory:') \
+        or url.query.get('mode') == 'memory'
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URI and profile"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        # The sqlite3 module's own lock wait, in seconds
+        connect_args = {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000, 'check_same_thread': False}
+        if _in_memory_sqlite(url):
+            # One shared connection (StaticPool), which takes no pool sizing
+            return {'connect_args': connect_args}
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'connect_args': connect_args,
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+
+
+def database_uri(url, default_sqlite_path):
+    """Normalise DATABASE_URL; fall back to the bundled SQLite file"""
+    if not url:
+        return 'sqlite:///' + default_sqlite_path
+    if url.startswith('postgres://'):
+        # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def configure_engine(app):
+    """Apply the SQLite profile pragmas to every connection the engine opens"""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    profile = app.config['DB_PROFILE']
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{profile}', expected one of {sorted(SQLITE_PROFILES)}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    if profile != 'development':
+        pragmas['cache_size'] = -app.config['SQLITE_CACHE_SIZE_KB']  # Negative means KiB
+        pragmas['mmap_size'] = app.config['SQLITE_MMAP_SIZE']
+    pragmas['busy_timeout'] = app.config['SQLITE_BUSY_TIMEOUT']
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    # Connections opened before the listener existed miss the pragmas
+    engine.dispose()
@@ -0,0 +1,94 @@
+# gateways.py
+import base64
+import hashlib
+import hmac
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+
+# What a gateway needs to confirm one payment
+VerificationRequest = namedtuple('VerificationRequest',
+                                 ['payment_order_id', 'gateway_payment_id', 'signature', 'amount', 'currency'])
+
+# A confirmed payment as reported by the gateway
+GatewayResult = namedtuple('GatewayResult', ['payment_id', 'payment_method'])
+
+
+class PaymentDeclined(Exception):
+    """The gateway rejected the payment; retrying will not help"""
+
+
+class GatewayUnavailable(Exception):
+    """The gateway could not be reached or answered with a server error; retry later"""
+
+
+class LocalGateway:
+    """Stand-in gateway for development and tests.
+
+    Approves every payment after `latency` seconds, except payment ids that
+    start with 'fail', which are declined.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def verify(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        if (request.gateway_payment_id or '').startswith('fail'):
+            raise PaymentDeclined('Payment declined by the local gateway')
+        return GatewayResult(request.gateway_payment_id or f'local_{request.payment_order_id}', None)
+
+
+class RazorpayGateway:
+    """Checks the checkout signature, then confirms the payment with the Razorpay API"""
+
+    API_URL = 'https://api.razorpay.com/v1/payments/'
+
+    def __init__(self, key_id, key_secret, timeout=10):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.timeout = timeout
+
+    def signature_for(self, payment_order_id, gateway_payment_id):
+        message = f'{payment_order_id}|{gateway_payment_id}'.encode()
+        return hmac.new(self.key_secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def verify(self, request):
+        if not request.gateway_payment_id or not request.signature:
+            raise PaymentDeclined('Missing payment id or signature')
+        expected = self.signature_for(request.payment_order_id, request.gateway_payment_id)
+        if not hmac.compare_digest(expected, request.signature):
+            raise PaymentDeclined('Invalid payment signature')
+
+        payment = self._fetch_payment(request.gateway_payment_id)
+        if payment.get('status') not in ('authorized', 'captured'):
+            raise PaymentDeclined(f"Payment is {payment.get('status')}")
+        if payment.get('amount') != round(request.amount * 100) or payment.get('currency') != request.currency:
+            raise PaymentDeclined('Paid amount does not match the order')
+        return GatewayResult(request.gateway_payment_id, payment.get('method'))
+
+    def _fetch_payment(self, gateway_payment_id):
+        credentials = base64.b64encode(f'{self.key_id}:{self.key_secret}'.encode()).decode()
+        http_request = urllib.request.Request(self.API_URL + gateway_payment_id,
+                                              headers={'Authorization': f'Basic {credentials}'})
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code >= 500 or e.code == 429:
+                raise GatewayUnavailable(f'Razorpay answered {e.code}')
+            raise PaymentDeclined(f'Razorpay rejected the payment lookup ({e.code})')
+        except (urllib.error.URLError, TimeoutError, ValueError) as e:
+            raise GatewayUnavailable(f'Razorpay request failed: {e}')
+
+
+def gateway_from_config(config):
+    if config['PAYMENT_GATEWAY'] == 'razorpay':
+        return RazorpayGateway(config['RAZORPAY_KEY_ID'], config['RAZORPAY_KEY_SECRET'],
+                               timeout=config['PAYMENT_GATEWAY_TIMEOUT'])
+    if config['PAYMENT_GATEWAY'] == 'local':
+        return LocalGateway(latency=config['LOCAL_GATEWAY_LATENCY'])
+    raise ValueError(f"Unknown PAYMENT_GATEWAY: {config['PAYMENT_GATEWAY']}")
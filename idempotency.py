@@ -0,0 +1,83 @@
+# idempotency.py
+import hashlib
+import json
+from flask import request
+from sqlalchemy import insert
+from models import db, IdempotencyKey
+
+# Longest accepted Idempotency-Key header value
+MAX_KEY_LENGTH = 100
+
+
+class IdempotencyError(ValueError):
+    """Raised for a malformed key or a key reused with a different request"""
+
+
+def get_idempotency_key():
+    """Read the Idempotency-Key header, or None when the client did not send one"""
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters')
+    return key
+
+
+def request_fingerprint(data):
+    """Stable hash of a JSON request body"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def validate_key(key):
+    """Normalise a client-supplied key; raises IdempotencyError when it is unusable"""
+    key = key.strip() if isinstance(key, str) else ''
+    if not key:
+        raise IdempotencyError('An idempotency key is required')
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f'Idempotency keys must be at most {MAX_KEY_LENGTH} characters')
+    return key
+
+
+def stored_response(record, endpoint, request_hash):
+    """(body, status) of a stored record, if it was recorded for the same request"""
+    if record.endpoint != endpoint or record.request_hash != request_hash:
+        raise IdempotencyError('Idempotency-Key was already used for a different request')
+    return record.response_body, record.response_status
+
+
+def find_stored_response(user_id, key, endpoint, request_hash):
+    """Return (body, status) recorded for this key, or None if the key is new"""
+    record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if not record:
+        return None
+    return stored_response(record, endpoint, request_hash)
+
+
+def find_stored_records(user_id, keys):
+    """{key: IdempotencyKey} for those of the keys the user has already used, in one query"""
+    if not keys:
+        return {}
+    records = IdempotencyKey.query.filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key.in_(keys))
+    return {record.key: record for record in records}
+
+
+def store_responses(user_id, endpoint, responses):
+    """Bulk form of store_response for [(key, request_hash, body, status), ...]"""
+    db.session.execute(insert(IdempotencyKey), [
+        {'user_id': user_id, 'key': key, 'endpoint': endpoint, 'request_hash': request_hash,
+         'response_status': status, 'response_body': body}
+        for key, request_hash, body, status in responses
+    ])
+
+
+def store_response(user_id, key, endpoint, request_hash, body, status=200):
+    """Add the response for this key to the current transaction"""
+    db.session.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        endpoint=endpoint,
+        request_hash=request_hash,
+        response_status=status,
+        response_body=body
+    ))
@@ -0,0 +1,94 @@
+# ids.py
+import os
+import threading
+import time
+
+# Crockford base32: sortable, case-insensitive, no I/L/O/U
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Bit layout, most significant first: 48-bit ms timestamp | 16-bit node | 22-bit pid | 14-bit sequence
+TIMESTAMP_BITS = 48
+NODE_BITS = 16
+PID_BITS = 22
+SEQUENCE_BITS = 14
+ID_LENGTH = 20  # 100 bits / 5 bits per character
+
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class IdGenerator:
+    """Time-ordered unique ids, safe across threads, worker processes and hosts.
+
+    Ids sort by creation time, so inserts append to the end of the unique
+    index. The pid field keeps workers on one host apart; node_id (one per
+    host) keeps hosts apart.
+    """
+
+    def __init__(self, node_id=0):
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f'node_id must be between 0 and {MAX_NODE_ID}')
+        self.node_id = node_id
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_ms = 0
+        self._sequence = 0
+
+    def configure(self, node_id):
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f'node_id must be between 0 and {MAX_NODE_ID}')
+        with self._lock:
+            self.node_id = node_id
+
+    def next_id(self):
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                # Forked worker: never continue the parent's sequence
+                self._pid = pid
+                self._last_ms = 0
+                self._sequence = 0
+
+            now_ms = int(time.time() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # Same millisecond or the clock moved back: keep counting from the last value
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+
+            value = self._last_ms
+            value = (value << NODE_BITS) | self.node_id
+            value = (value << PID_BITS) | (pid & ((1 << PID_BITS) - 1))
+            value = (value << SEQUENCE_BITS) | self._sequence
+        return encode_base32(value, ID_LENGTH)
+
+
+def encode_base32(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def id_timestamp(id_string):
+    """Creation time (seconds since epoch) encoded in an id"""
+    value = 0
+    for char in id_string.upper():
+        value = (value << 5) | ALPHABET.index(char)
+    return (value >> (NODE_BITS + PID_BITS + SEQUENCE_BITS)) / 1000.0
+
+
+id_generator = IdGenerator()
+
+
+def new_order_id():
+    return id_generator.next_id()
+
+
+def new_payment_order_id():
+    return id_generator.next_id()
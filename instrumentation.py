@@ -0,0 +1,90 @@
+# instrumentation.py
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+# Longest statement text written to the slow-request log
+LOGGED_STATEMENT_LENGTH = 300
+
+
+class RequestDbStats:
+    """SQL activity of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement, elapsed):
+        self.query_count += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+
+def init_instrumentation(app):
+    """Hook SQL timing into the engine and request lifecycle when SQL_INSTRUMENTATION is on"""
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def _start_request_stats():
+        g.db_stats = RequestDbStats()
+
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = g.pop('db_stats', None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.db_time * 1000
+        slowest_ms = stats.slowest_time * 1000
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.2f};desc="{stats.query_count} queries"')
+        response.headers.add('Server-Timing', f'db-slowest;dur={slowest_ms:.2f}')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+
+        reasons = []
+        if total_ms >= app.config['SLOW_REQUEST_MS']:
+            reasons.append(f'took {total_ms:.1f} ms')
+        if stats.query_count > app.config['SLOW_REQUEST_MAX_QUERIES']:
+            reasons.append(f'ran {stats.query_count} queries')
+        if slowest_ms >= app.config['SLOW_QUERY_MS']:
+            reasons.append(f'slowest query {slowest_ms:.1f} ms')
+        if reasons:
+            statement = ' '.join((stats.slowest_statement or '').split())[:LOGGED_STATEMENT_LENGTH]
+            app.logger.warning(
+                'Slow request %s %s (%s): %d queries, %.1f ms in DB; slowest %.1f ms: %s',
+                request.method, request.path, ', '.join(reasons),
+                stats.query_count, db_ms, slowest_ms, statement
+            )
+        return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    if has_request_context():
+        stats = g.get('db_stats')
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start_time'):
+        connection.info['query_start_time'].pop()
@@ -0,0 +1,47 @@
+# json_provider.py
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional dependency; the stdlib encoder is used without it
+    orjson = None
+
+# JSON_BACKEND values
+JSON_BACKENDS = ('auto', 'orjson', 'stdlib')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed.
+
+    Output matches the default provider: sorted keys, and dates, decimals and
+    UUIDs go through the same `default` hook. Indented (debug) responses keep
+    the stdlib encoder. Decoding stays on the stdlib.
+    """
+
+    def __init__(self, app, backend='auto'):
+        super().__init__(app)
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f"Unknown JSON_BACKEND '{backend}', expected one of {JSON_BACKENDS}")
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError("JSON_BACKEND is 'orjson' but orjson is not installed")
+        self.backend = 'orjson' if orjson is not None and backend != 'stdlib' else 'stdlib'
+        if self.backend == 'orjson':
+            self._options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps_bytes(self, obj):
+        """Compact UTF-8 JSON for obj"""
+        if self.backend == 'orjson':
+            return orjson.dumps(obj, default=self.default, option=self._options)
+        return super().dumps(obj, separators=(',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return self.dumps_bytes(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        if self.backend == 'stdlib' or pretty:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
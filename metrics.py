@@ -0,0 +1,235 @@
+# metrics.py
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from flask import g, request
+
+# Request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help) for every exported metric family
+METRIC_FAMILIES = {
+    'eprashadam_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+    'eprashadam_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint and status'),
+    'eprashadam_orders_created_total': ('counter', 'Orders created'),
+    'eprashadam_payments_verified_total': ('counter', 'Payments verified'),
+    'eprashadam_payment_jobs_total': ('counter', 'Payment verification jobs processed by result'),
+    'eprashadam_rate_limited_total': ('counter', 'Requests answered 429 by rate limit scope and key type'),
+    'eprashadam_requests_shed_total': ('counter', 'Requests answered 503 over the concurrency cap'),
+    'eprashadam_cache_requests_total': ('counter', 'In-process cache lookups by cache and result'),
+    'eprashadam_db_pool_size': ('gauge', 'Configured DB connection pool size per worker process'),
+    'eprashadam_db_pool_checked_out': ('gauge', 'DB connections in use per worker process'),
+    'eprashadam_db_pool_overflow': ('gauge', 'DB overflow connections open per worker process'),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """Low-overhead in-process metrics with optional multi-process aggregation.
+
+    Each worker aggregates in memory. When `directory` is set, workers write
+    their totals to <directory>/metrics-<pid>.json at most every
+    `flush_interval` seconds, and a scrape on any worker merges every file,
+    so the result covers all processes behind the load balancer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, label_key) -> value
+        self._histograms = {}  # (name, label_key) -> [bucket counts..., sum, count]
+        self._collectors = {}  # name -> collector
+        self.directory = None
+        self.flush_interval = 5
+        self._last_flush = 0.0
+
+    def configure(self, directory=None, flush_interval=None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            if not self.directory:
+                atexit.register(self.flush)  # Keep the last interval of an exiting worker
+        self.directory = directory
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def add_collector(self, name, collector):
+        """collector() -> iterable of (kind, name, labels, value) read at flush/scrape time.
+
+        Registering a name again replaces the earlier collector, so building
+        a second app in the same process does not count its sources twice.
+        """
+        self._collectors[name] = collector
+
+    def snapshot(self):
+        """This process's state in the on-disk format"""
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(series)] for (name, labels), series in self._histograms.items()]
+        gauges = []
+        for collector in list(self._collectors.values()):
+            for kind, name, labels, value in collector():
+                if kind == 'counter':
+                    counters.append([name, sorted(labels.items()), value])
+                else:
+                    gauges.append([name, sorted(labels.items()), value])
+        return {'pid': os.getpid(), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        data = self.snapshot()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(self.directory, f"metrics-{data['pid']}.json"))
+
+    def _process_snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Merge every process and render the Prometheus text exposition format"""
+        counters, histograms, gauges = {}, {}, {}
+        for data in self._process_snapshots():
+            alive = _pid_alive(data['pid'])
+            for name, labels, value in data['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, series in data['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [0] * len(series))
+                for i, value in enumerate(series):
+                    merged[i] += value
+            if alive:
+                # Gauges describe live processes only
+                for name, labels, value in data['gauges']:
+                    gauges[(name, tuple(map(tuple, labels)) + (('pid', str(data['pid'])),))] = value
+
+        lines = []
+        for family, (kind, help_text) in METRIC_FAMILIES.items():
+            source = {'counter': counters, 'gauge': gauges, 'histogram': histograms}[kind]
+            series = sorted((labels, value) for (name, labels), value in source.items() if name == family)
+            if not series:
+                continue
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            for labels, value in series:
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS, value):
+                        cumulative += count
+                        lines.append(f'{family}_bucket{_format_labels(labels + (("le", repr(bound)),))} {cumulative}')
+                    lines.append(f'{family}_bucket{_format_labels(labels + (("le", "+Inf"),))} {value[-1]}')
+                    lines.append(f'{family}_sum{_format_labels(labels)} {value[-2]:.6f}')
+                    lines.append(f'{family}_count{_format_labels(labels)} {value[-1]}')
+                else:
+                    lines.append(f'{family}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+metrics = Metrics()
+
+
+def init_metrics(app):
+    """Time every request and register the DB pool and cache collectors"""
+    metrics.configure(directory=app.config.get('METRICS_DIR'),
+                      flush_interval=app.config.get('METRICS_FLUSH_INTERVAL'))
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            status = str(response.status_code)
+            metrics.inc('eprashadam_http_requests_total', endpoint=endpoint, method=request.method, status=status)
+            metrics.observe('eprashadam_http_request_duration_seconds', time.perf_counter() - started,
+                            endpoint=endpoint, status=status)
+            metrics.maybe_flush()
+        return response
+
+
+def pool_collector(engine):
+    def collect():
+        pool = engine.pool
+        if not hasattr(pool, 'checkedout'):
+            return []
+        return [
+            ('gauge', 'eprashadam_db_pool_size', {}, pool.size()),
+            ('gauge', 'eprashadam_db_pool_checked_out', {}, pool.checkedout()),
+            ('gauge', 'eprashadam_db_pool_overflow', {}, max(pool.overflow(), 0)),
+        ]
+    return collect
+
+
+def cache_collector(name, cache):
+    """Export a cache's cumulative `hits`/`misses` attributes"""
+    def collect():
+        return [
+            ('counter', 'eprashadam_cache_requests_total', {'cache': name, 'result': 'hit'}, cache.hits),
+            ('counter', 'eprashadam_cache_requests_total', {'cache': name, 'result': 'miss'}, cache.misses),
+        ]
+    return collect
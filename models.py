@@ -36,6 +36,11 @@ class Prasadam(db.Model):
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     available = db.Column(db.Boolean, default=True)
+    stock = db.Column(db.Integer)  # Units left to reserve; NULL means unlimited
+
+    __table_args__ = (
+        db.Index('ix_prasadam_temple_available', 'temple_id', 'available'),  # Per-temple menu
+    )
 
 class Order(db.Model):
     __tablename__ = 'orders'
@@ -52,15 +57,131 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     payments = db.relationship('Payment', backref='order', lazy=True)
+    order_items = db.relationship('OrderItem', backref='order', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_orders_user_created', 'user_id', 'created_at'),  # Order history keyset pagination
+        db.Index('ix_orders_created', 'created_at'),  # Date-range exports
+    )
+
+class OrderItem(db.Model):
+    __tablename__ = 'order_items'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    prasadam_id = db.Column(db.Integer, db.ForeignKey('prasadam.id'), nullable=False)
+    temple_id = db.Column(db.Integer, db.ForeignKey('temples.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)  # Item name at order time
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Order time, for date-range reports
+
+    __table_args__ = (
+        db.Index('ix_order_items_temple_created', 'temple_id', 'created_at'),  # Per-temple fulfilment reports
+        db.Index('ix_order_items_prasadam_created', 'prasadam_id', 'created_at'),  # Per-item sales
+    )
+
+class DailyTempleSales(db.Model):
+    __tablename__ = 'daily_temple_sales'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # UTC date the order was placed
+    temple_id = db.Column(db.Integer, db.ForeignKey('temples.id'), nullable=False)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'temple_id', name='uq_daily_temple_sales'),
+        db.Index('ix_daily_temple_sales_temple_day', 'temple_id', 'day'),
+    )
+
+class DailyItemSales(db.Model):
+    __tablename__ = 'daily_item_sales'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # UTC date the order was placed
+    temple_id = db.Column(db.Integer, db.ForeignKey('temples.id'), nullable=False)
+    prasadam_id = db.Column(db.Integer, db.ForeignKey('prasadam.id'), nullable=False)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'prasadam_id', name='uq_daily_item_sales'),
+        db.Index('ix_daily_item_sales_temple_day', 'temple_id', 'day'),
+        db.Index('ix_daily_item_sales_prasadam_day', 'prasadam_id', 'day'),
+    )
 
 class Payment(db.Model):
     __tablename__ = 'payments'
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     payment_order_id = db.Column(db.String(100), unique=True)
     payment_id = db.Column(db.String(100))
     amount = db.Column(db.Float, nullable=False)
     currency = db.Column(db.String(10), default='INR')
     status = db.Column(db.String(50), default='pending')
     payment_method = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CatalogState(db.Model):
+    __tablename__ = 'catalog_state'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # Bumped on every temple/prasadam change
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)  # Client-supplied Idempotency-Key header
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    response_status = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_user_key'),
+    )
+
+class PaymentJob(db.Model):
+    __tablename__ = 'payment_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=False, index=True)
+    gateway_payment_id = db.Column(db.String(100))  # As reported by the checkout
+    signature = db.Column(db.String(200))
+    payment_method = db.Column(db.String(50))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, processing, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Retry backoff
+    locked_until = db.Column(db.DateTime)  # Lease of the worker processing it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    payment = db.relationship('Payment')
+
+    __table_args__ = (
+        db.Index('ix_payment_jobs_status_available', 'status', 'available_at'),  # Claiming the next job
+    )
+
+class StockReservation(db.Model):
+    __tablename__ = 'stock_reservations'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    prasadam_id = db.Column(db.Integer, db.ForeignKey('prasadam.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='held')  # held, committed, released
+    expires_at = db.Column(db.DateTime)  # NULL while the order's payment is being verified
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_stock_reservations_status_expires', 'status', 'expires_at'),  # Timeout sweep
+    )
+
+class WebSession(db.Model):
+    __tablename__ = 'web_sessions'
+    id = db.Column(db.String(64), primary_key=True)  # SHA-256 of the cookie's session id
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    data = db.Column(db.Text, nullable=False)  # Flask's tagged JSON
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
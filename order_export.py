@@ -0,0 +1,120 @@
+# order_export.py
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+import click
+from flask.cli import with_appcontext
+from models import db, Order, Payment
+
+# One row per (order, payment); orders without a payment get empty payment columns
+EXPORT_FIELDS = ['order_id', 'order_pk', 'created_at', 'user_id', 'user_name', 'user_email',
+                 'status', 'total_amount', 'payment_order_id', 'payment_id', 'payment_status',
+                 'payment_method', 'payment_amount', 'currency', 'payment_created_at']
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Bytes buffered before a chunk is handed to the writer or the HTTP response
+CHUNK_SIZE = 64 * 1024
+
+
+class ExportFilterError(ValueError):
+    """Raised for an invalid export filter; the message is safe to show to the client"""
+
+
+def parse_timestamp(value, name):
+    """ISO date or datetime -> naive UTC datetime (None passes through)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportFilterError(f'{name} must be an ISO date or datetime, e.g. 2024-01-31')
+    if parsed.tzinfo is not None:
+        # created_at is stored as naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def export_rows(since=None, until=None, status=None, payment_status=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield orders joined with their payments, oldest first.
+
+    since is inclusive and until exclusive. Plain column rows are fetched
+    batch_size at a time (a server-side cursor where the driver has one),
+    so memory stays flat however many orders match.
+    """
+    query = db.session.query(
+        Order.order_id, Order.id, Order.created_at, Order.user_id, Order.user_name, Order.user_email,
+        Order.status, Order.total_amount, Payment.payment_order_id, Payment.payment_id, Payment.status,
+        Payment.payment_method, Payment.amount, Payment.currency, Payment.created_at
+    ).outerjoin(Payment, Payment.order_id == Order.id)
+
+    if since:
+        query = query.filter(Order.created_at >= since)
+    if until:
+        query = query.filter(Order.created_at < until)
+    if status:
+        query = query.filter(Order.status == status)
+    if payment_status:
+        query = query.filter(Payment.status == payment_status)
+
+    query = query.order_by(Order.created_at, Order.id)\
+        .execution_options(yield_per=batch_size)
+    for row in query:
+        record = dict(zip(EXPORT_FIELDS, row))
+        for key in ('created_at', 'payment_created_at'):
+            if record[key] is not None:
+                record[key] = record[key].isoformat()
+        yield record
+
+
+def encode_rows(rows, fmt):
+    """Serialize rows to CSV or JSON Lines text in chunks of about CHUNK_SIZE"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row))
+            buffer.write('\n')
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@click.command('export-orders')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+@click.option('--since', help='Orders created at or after this ISO date/datetime (UTC)')
+@click.option('--until', help='Orders created before this ISO date/datetime (UTC)')
+@click.option('--status', help='Only orders with this status, e.g. confirmed')
+@click.option('--payment-status', help='Only payments with this status, e.g. completed')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows fetched per round trip')
+@with_appcontext
+def export_orders_command(path, fmt, since, until, status, payment_status, batch_size):
+    """Stream orders and their payments to a CSV or JSON Lines file ('-' for stdout)"""
+    try:
+        rows = export_rows(parse_timestamp(since, '--since'), parse_timestamp(until, '--until'),
+                           status, payment_status, batch_size)
+    except ExportFilterError as e:
+        raise click.BadParameter(str(e))
+
+    if path == '-':
+        for chunk in encode_rows(rows, fmt):
+            sys.stdout.write(chunk)
+        return
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in encode_rows(rows, fmt):
+            f.write(chunk)
+    os.replace(tmp_path, path)
+    click.echo(f'Exported orders to {path}')
@@ -0,0 +1,156 @@
+# order_items.py
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert
+from models import db, Order, OrderItem, Temple
+from pricing import load_price_table
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Accepted group_by values for item_sales()
+REPORT_GROUPS = ('item', 'temple')
+
+
+def order_item_values(lines):
+    """Column values of the order_items rows for the priced lines of a new order"""
+    return [
+        {
+            'prasadam_id': line['id'],
+            'temple_id': line['temple_id'],
+            'name': line['name'],
+            'quantity': line['quantity'],
+            'unit_price': line['price']
+        }
+        for line in lines
+    ]
+
+
+def order_items_for(lines):
+    """OrderItem rows for the priced lines of a new order"""
+    return [OrderItem(**values) for values in order_item_values(lines)]
+
+
+def _parse_line(line):
+    """(prasadam_id, temple_id or None, name, quantity, unit_price) from a stored JSON line, or None"""
+    if not isinstance(line, dict):
+        return None
+    try:
+        prasadam_id = int(line['id'])
+        quantity = int(line.get('quantity', 1))
+        unit_price = float(line['price'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    temple_id = line.get('temple_id')
+    return prasadam_id, int(temple_id) if temple_id else None, line.get('name'), quantity, unit_price
+
+
+def backfill_order_items(batch_size=DEFAULT_BATCH_SIZE):
+    """Copy Order.items JSON into order_items for orders that have no rows yet.
+
+    Walks orders by id in batches, one bulk INSERT and commit per batch.
+    Lines written before orders stored temple ids are resolved against the
+    prasadam table in one query per batch. Returns (orders, items, skipped).
+    """
+    last_id = 0
+    orders_done = items_done = skipped = 0
+    while True:
+        orders = db.session.query(Order.id, Order.items, Order.created_at)\
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id)\
+            .filter(OrderItem.id.is_(None), Order.id > last_id)\
+            .order_by(Order.id)\
+            .limit(batch_size)\
+            .all()
+        if not orders:
+            break
+        last_id = orders[-1].id
+
+        parsed = []
+        for order_id, items, created_at in orders:
+            for line in items or []:
+                values = _parse_line(line)
+                if values is None:
+                    skipped += 1
+                    continue
+                parsed.append((order_id, created_at, values))
+
+        catalog = load_price_table(list({values[0] for _, _, values in parsed}))
+        rows = []
+        for order_id, created_at, (prasadam_id, temple_id, name, quantity, unit_price) in parsed:
+            entry = catalog.get(prasadam_id)
+            if entry is None:
+                skipped += 1  # Item no longer exists
+                continue
+            rows.append({
+                'order_id': order_id,
+                'prasadam_id': prasadam_id,
+                'temple_id': temple_id or entry.temple_id,
+                'name': name or entry.name,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'created_at': created_at
+            })
+        if rows:
+            db.session.execute(insert(OrderItem), rows)
+        db.session.commit()
+        orders_done += len(orders)
+        items_done += len(rows)
+    return orders_done, items_done, skipped
+
+
+def item_sales(group_by='item', since=None, until=None, temple_id=None, prasadam_id=None, status=None):
+    """Quantity, revenue and order count per item or per temple, aggregated in SQL.
+
+    since/until filter on order time (until exclusive); status filters on the
+    order status and is the only filter that needs the orders table.
+    """
+    revenue = func.sum(OrderItem.quantity * OrderItem.unit_price)
+    columns = [OrderItem.temple_id, Temple.name]
+    if group_by == 'item':
+        columns += [OrderItem.prasadam_id, func.max(OrderItem.name)]
+    query = db.session.query(
+        *columns,
+        func.count(func.distinct(OrderItem.order_id)),
+        func.sum(OrderItem.quantity),
+        revenue
+    ).join(Temple, Temple.id == OrderItem.temple_id)
+
+    if since:
+        query = query.filter(OrderItem.created_at >= since)
+    if until:
+        query = query.filter(OrderItem.created_at < until)
+    if temple_id:
+        query = query.filter(OrderItem.temple_id == temple_id)
+    if prasadam_id:
+        query = query.filter(OrderItem.prasadam_id == prasadam_id)
+    if status:
+        query = query.join(Order, Order.id == OrderItem.order_id).filter(Order.status == status)
+
+    group = [OrderItem.temple_id, Temple.name]
+    if group_by == 'item':
+        group.append(OrderItem.prasadam_id)
+    results = []
+    for row in query.group_by(*group).order_by(revenue.desc()):
+        if group_by == 'item':
+            temple, temple_name, item_id, name, orders, quantity, total = row
+        else:
+            temple, temple_name, orders, quantity, total = row
+        result = {
+            'temple_id': temple,
+            'temple_name': temple_name,
+            'orders': orders,
+            'quantity': quantity,
+            'revenue': round(total or 0, 2)
+        }
+        if group_by == 'item':
+            result.update({'prasadam_id': item_id, 'name': name})
+        results.append(result)
+    return results
+
+
+@click.command('backfill-order-items')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Orders per transaction')
+@with_appcontext
+def backfill_order_items_command(batch_size):
+    """Fill order_items from the JSON items of existing orders (safe to re-run)"""
+    orders, items, skipped = backfill_order_items(batch_size)
+    click.echo(f'Backfilled {items} items from {orders} orders; skipped {skipped} unreadable or deleted lines')
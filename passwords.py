@@ -0,0 +1,134 @@
+# passwords.py
+import base64
+import hashlib
+import hmac
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Unsalted SHA-256 hex digests written before versioned hashes existed
+LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class PasswordHasher:
+    """Salted KDF hashing with a versioned, self-describing format.
+
+    scrypt$<n>$<r>$<p>$<salt>$<key>
+    pbkdf2_sha256$<iterations>$<salt>$<key>
+
+    KDF work runs on a bounded thread pool so a burst of logins cannot
+    run more than `workers` hashes at once.
+    """
+
+    def __init__(self, scheme='scrypt', scrypt_n=2 ** 14, scrypt_r=8, scrypt_p=1,
+                 pbkdf2_iterations=600000, workers=4):
+        self.scheme = scheme
+        self.scrypt_n = scrypt_n
+        self.scrypt_r = scrypt_r
+        self.scrypt_p = scrypt_p
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.workers = workers
+        self._executor = None
+        self._dummy_hash = None
+
+    def configure(self, **settings):
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise AttributeError(f'Unknown password hasher setting: {name}')
+            setattr(self, name, value)
+        self._dummy_hash = None  # Recomputed with the new cost
+        if self.scheme not in ('scrypt', 'pbkdf2_sha256'):
+            raise ValueError(f'Unsupported password hash scheme: {self.scheme}')
+        if self._executor is not None and 'workers' in settings:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix='password-hash')
+        return self._executor
+
+    def hash(self, password):
+        """Hash a password with the current scheme and cost"""
+        salt = os.urandom(SALT_BYTES)
+        if self.scheme == 'scrypt':
+            key = self._scrypt(password, salt, self.scrypt_n, self.scrypt_r, self.scrypt_p)
+            return f'scrypt${self.scrypt_n}${self.scrypt_r}${self.scrypt_p}${_b64(salt)}${_b64(key)}'
+        key = self._pbkdf2(password, salt, self.pbkdf2_iterations)
+        return f'pbkdf2_sha256${self.pbkdf2_iterations}${_b64(salt)}${_b64(key)}'
+
+    def verify(self, password, stored):
+        """Check a password against any supported stored format"""
+        if LEGACY_SHA256.match(stored):
+            expected = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(expected, stored)
+
+        parts = stored.split('$')
+        try:
+            if parts[0] == 'scrypt' and len(parts) == 6:
+                n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+                key = self._scrypt(password, _unb64(parts[4]), n, r, p)
+                return hmac.compare_digest(key, _unb64(parts[5]))
+            if parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+                key = self._pbkdf2(password, _unb64(parts[2]), int(parts[1]))
+                return hmac.compare_digest(key, _unb64(parts[3]))
+        except ValueError:
+            return False
+        return False
+
+    def needs_rehash(self, stored):
+        """True when a stored hash is legacy or uses other parameters than the current ones"""
+        parts = stored.split('$')
+        if self.scheme == 'scrypt':
+            return parts[:4] != ['scrypt', str(self.scrypt_n), str(self.scrypt_r), str(self.scrypt_p)]
+        return parts[:2] != ['pbkdf2_sha256', str(self.pbkdf2_iterations)]
+
+    def check(self, password, stored):
+        """Verify and, when the stored hash is outdated, compute its replacement.
+
+        Returns (valid, new_hash); new_hash is None when no upgrade is needed.
+        """
+        if not self.verify(password, stored):
+            return False, None
+        if self.needs_rehash(stored):
+            return True, self.hash(password)
+        return True, None
+
+    @property
+    def dummy_hash(self):
+        """A hash at the current cost that matches no password, for checks against unknown accounts"""
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(os.urandom(SALT_BYTES).hex())
+        return self._dummy_hash
+
+    def hash_in_pool(self, password):
+        return self.executor.submit(self.hash, password).result()
+
+    def check_in_pool(self, password, stored):
+        return self.executor.submit(self.check, password, stored).result()
+
+    @staticmethod
+    def _scrypt(password, salt, n, r, p):
+        # maxmem must cover 128 * n * r bytes plus overhead
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r, dklen=KEY_BYTES)
+
+    @staticmethod
+    def _pbkdf2(password, salt, iterations):
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations, dklen=KEY_BYTES)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,261 @@
+# payment_queue.py
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, or_
+from models import db, Order, Payment, PaymentJob
+from gateways import VerificationRequest, PaymentDeclined, gateway_from_config
+from metrics import metrics
+from sales_stats import record_confirmed_order, CONFIRMED_STATUS
+from stock import commit_reservations, release_reservations, rearm_reservations
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_JOB_STATUSES = ('queued', 'processing')
+
+# Client-facing statuses after which status polling stops
+TERMINAL_PAYMENT_STATUSES = ('completed', 'failed')
+
+
+def enqueue_verification(payment, gateway_payment_id=None, signature=None, payment_method=None):
+    """Queue a verification job for the payment, or return the one already queued.
+
+    Retrying a declined payment puts it and its order back to pending, so
+    the status reflects the new job rather than the old decline. The caller
+    commits; the job is durable from then on.
+    """
+    job = PaymentJob.query.filter(PaymentJob.payment_id == payment.id,
+                                  PaymentJob.status.in_(ACTIVE_JOB_STATUSES)).first()
+    if job:
+        return job
+    if payment.status == 'failed':
+        payment.status = 'pending'
+        if payment.order.status == 'payment_failed':
+            payment.order.status = 'payment_pending'
+    now = datetime.utcnow()
+    job = PaymentJob(
+        payment_id=payment.id,
+        gateway_payment_id=gateway_payment_id,
+        signature=signature,
+        payment_method=payment_method,
+        status='queued',
+        available_at=now,
+        updated_at=now
+    )
+    db.session.add(job)
+    return job
+
+
+def _claimable(now):
+    # Queued and due, or processing under a lease whose worker died
+    return or_(
+        and_(PaymentJob.status == 'queued', PaymentJob.available_at <= now),
+        and_(PaymentJob.status == 'processing', PaymentJob.locked_until < now)
+    )
+
+
+def claim_job(lease_seconds):
+    """Take the next due job with a conditional UPDATE; safe across threads and processes"""
+    while True:
+        now = datetime.utcnow()
+        job_id = db.session.query(PaymentJob.id)\
+            .filter(_claimable(now))\
+            .order_by(PaymentJob.available_at, PaymentJob.id)\
+            .limit(1)\
+            .scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = PaymentJob.query.filter(PaymentJob.id == job_id, _claimable(now)).update({
+            'status': 'processing',
+            'attempts': PaymentJob.attempts + 1,
+            'locked_until': now + timedelta(seconds=lease_seconds),
+            'updated_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return job_id
+        # Another worker took it between the SELECT and the UPDATE; try the next one
+
+
+def _finish(job, status, error=None):
+    job.status = status
+    job.last_error = error
+    job.locked_until = None
+    job.updated_at = datetime.utcnow()
+
+
+def process_job(job_id, gateway, max_attempts):
+    """Verify one claimed job with the gateway and record the outcome"""
+    job = db.session.get(PaymentJob, job_id)
+    payment = job.payment
+    request = VerificationRequest(payment.payment_order_id, job.gateway_payment_id, job.signature,
+                                  payment.amount, payment.currency)
+    # End the read transaction so no connection is held during gateway I/O
+    db.session.commit()
+
+    try:
+        result = gateway.verify(request)
+    except PaymentDeclined as e:
+        job = db.session.get(PaymentJob, job_id)
+        job.payment.status = 'failed'
+        job.payment.order.status = 'payment_failed'
+        release_reservations([job.payment.order_id])
+        _finish(job, 'failed', str(e))
+        db.session.commit()
+        metrics.inc('eprashadam_payment_jobs_total', result='declined')
+        return
+    except Exception as e:
+        # GatewayUnavailable or an unexpected error: back off and retry
+        job = db.session.get(PaymentJob, job_id)
+        if job.attempts >= max_attempts:
+            _finish(job, 'failed', f'Gave up after {job.attempts} attempts: {e}')
+            # Unverified, not declined: the client may retry before the reservation times out
+            rearm_reservations(job.payment.order_id)
+            metrics.inc('eprashadam_payment_jobs_total', result='gave_up')
+        else:
+            job.status = 'queued'
+            job.last_error = str(e)
+            job.locked_until = None
+            job.available_at = datetime.utcnow() + timedelta(seconds=2 ** job.attempts)
+            job.updated_at = datetime.utcnow()
+            metrics.inc('eprashadam_payment_jobs_total', result='retry')
+        db.session.commit()
+        logger.warning('Payment job %s attempt %s failed: %s', job_id, job.attempts, e)
+        return
+
+    job = db.session.get(PaymentJob, job_id)
+    payment = job.payment
+    order = payment.order
+    payment.status = 'completed'
+    payment.payment_id = result.payment_id
+    payment.payment_method = result.payment_method or job.payment_method or 'card'
+    # Count the order in the sales aggregates once, even if a job is retried
+    if order.status != CONFIRMED_STATUS:
+        order.status = CONFIRMED_STATUS
+        record_confirmed_order(order)
+        commit_reservations(order.id)
+    _finish(job, 'succeeded')
+    db.session.commit()
+    metrics.inc('eprashadam_payments_verified_total')
+    metrics.inc('eprashadam_payment_jobs_total', result='succeeded')
+
+
+def payment_state(payment_order_id, user_id):
+    """Client-facing verification state of a payment, or None if it is not the user's"""
+    row = db.session.query(Payment, Order.id)\
+        .join(Order, Order.id == Payment.order_id)\
+        .filter(Payment.payment_order_id == payment_order_id, Order.user_id == user_id)\
+        .first()
+    if row is None:
+        return None
+    payment, order_id = row
+    job = PaymentJob.query.filter_by(payment_id=payment.id).order_by(PaymentJob.id.desc()).first()
+
+    if job is not None and job.status in ACTIVE_JOB_STATUSES:
+        status = job.status  # A retry in flight outranks the outcome of an earlier attempt
+    elif payment.status in TERMINAL_PAYMENT_STATUSES:
+        status = payment.status
+    elif job is None:
+        status = 'pending'
+    else:
+        status = 'failed' if job.status == 'failed' else 'pending'
+    state = {
+        'payment_order_id': payment.payment_order_id,
+        'order_id': order_id,
+        'status': status,
+        'payment_id': payment.payment_id
+    }
+    if status == 'failed' and job is not None:
+        state['message'] = job.last_error
+    return state
+
+
+class PaymentWorkerPool:
+    """Threads that claim and process payment jobs.
+
+    Web processes start the pool on their first enqueue, so booting a worker
+    stays free of database work; `flask --app app payment-worker` runs a
+    dedicated pool instead. Jobs finished in this process wake long-polling
+    status requests immediately; others notice on their next poll.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self.job_done = threading.Condition()
+
+    def ensure_started(self, app):
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            gateway = gateway_from_config(app.config)
+            self._threads = [
+                threading.Thread(target=self._run, args=(app, gateway), daemon=True,
+                                 name=f'payment-worker-{i}')
+                for i in range(app.config['PAYMENT_WORKERS'])
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def wait_for_update(self, timeout):
+        with self.job_done:
+            self.job_done.wait(timeout)
+
+    def _run(self, app, gateway):
+        config = app.config
+        while not self._stopping.is_set():
+            try:
+                with app.app_context():
+                    job_id = claim_job(config['PAYMENT_JOB_LEASE'])
+                    if job_id is not None:
+                        process_job(job_id, gateway, config['PAYMENT_JOB_MAX_ATTEMPTS'])
+            except Exception:
+                logger.exception('Payment worker error')
+                job_id = None
+            if job_id is not None:
+                with self.job_done:
+                    self.job_done.notify_all()
+                continue
+            self._wakeup.wait(config['PAYMENT_QUEUE_POLL_INTERVAL'])
+            self._wakeup.clear()
+
+
+payment_workers = PaymentWorkerPool()
+
+
+@click.command('payment-worker')
+@click.option('--threads', type=int, help='Worker threads (default PAYMENT_WORKERS)')
+@with_appcontext
+def payment_worker_command(threads):
+    """Process payment verification jobs until interrupted"""
+    app = current_app._get_current_object()
+    if threads:
+        app.config['PAYMENT_WORKERS'] = threads
+    payment_workers.ensure_started(app)
+    click.echo(f"Processing payment jobs with {app.config['PAYMENT_WORKERS']} threads (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        payment_workers.stop()
@@ -0,0 +1,103 @@
+# pricing.py
+from collections import namedtuple
+from models import db, Prasadam, Temple
+
+# Upper bound on distinct lines in one cart (bulk temple-trust orders included)
+MAX_CART_LINES = 1000
+
+# Upper bound on the quantity of one item, repeated lines merged
+MAX_ITEM_QUANTITY = 1000
+
+
+# One row of the price table built for a cart
+PriceEntry = namedtuple('PriceEntry', ['price', 'name', 'temple_id', 'temple_name', 'available', 'stock'])
+
+
+class PricingError(ValueError):
+    """Raised when a cart cannot be priced; the message is safe to show to the client"""
+
+
+class PricedCart:
+    def __init__(self, lines, total_amount, limited=()):
+        self.lines = lines
+        self.total_amount = total_amount
+        # (prasadam_id, quantity, stock seen while pricing) for items with limited stock
+        self.limited = list(limited)
+
+
+def _is_integer(value):
+    # JSON true/false decode to bool, a subclass of int, and are not quantities
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_cart_items(items):
+    """Validate client cart lines and merge repeated ids -> {prasadam_id: quantity}"""
+    if not isinstance(items, list) or not items:
+        raise PricingError('items must be a non-empty list')
+
+    quantities = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise PricingError('Each item must be an object with id and quantity')
+        item_id = item.get('id')
+        quantity = item.get('quantity', 1)
+        if not _is_integer(item_id) or not _is_integer(quantity):
+            raise PricingError('Each item must have an integer id and quantity')
+        if quantity < 1:
+            raise PricingError(f'Invalid quantity for item {item_id}')
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+        if quantities[item_id] > MAX_ITEM_QUANTITY:
+            raise PricingError(f'At most {MAX_ITEM_QUANTITY} of item {item_id} can be ordered at once')
+
+    if len(quantities) > MAX_CART_LINES:
+        raise PricingError(f'A cart can contain at most {MAX_CART_LINES} different items')
+    return quantities
+
+
+def load_price_table(item_ids):
+    """Resolve every item id in one IN (...) query -> {id: PriceEntry}"""
+    if not item_ids:
+        return {}
+    rows = db.session.query(
+        Prasadam.id, Prasadam.price, Prasadam.name, Prasadam.available, Prasadam.stock, Temple.id, Temple.name
+    ).join(Temple, Prasadam.temple_id == Temple.id)\
+        .filter(Prasadam.id.in_(item_ids))\
+        .all()
+    return {
+        item_id: PriceEntry(price, name, temple_id, temple_name, bool(available), stock)
+        for item_id, price, name, available, stock, temple_id, temple_name in rows
+    }
+
+
+def price_cart(items, price_table=None):
+    """Price a cart from server-side prices, ignoring any client-supplied price or total"""
+    quantities = parse_cart_items(items)
+    if price_table is None:
+        price_table = load_price_table(list(quantities))
+
+    lines = []
+    limited = []
+    total = 0.0
+    unavailable = []
+    for item_id, quantity in quantities.items():
+        entry = price_table.get(item_id)
+        if entry is None or not entry.available:
+            unavailable.append(item_id)
+            continue
+        line_total = round(entry.price * quantity, 2)
+        total += line_total
+        lines.append({
+            'id': item_id,
+            'name': entry.name,
+            'temple_id': entry.temple_id,
+            'temple_name': entry.temple_name,
+            'quantity': quantity,
+            'price': entry.price,
+            'line_total': line_total
+        })
+        if entry.stock is not None:
+            limited.append((item_id, quantity, entry.stock))
+
+    if unavailable:
+        raise PricingError('Items not available: ' + ', '.join(str(i) for i in sorted(unavailable)))
+    return PricedCart(lines, round(total, 2), limited)
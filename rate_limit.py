@@ -0,0 +1,181 @@
+# rate_limit.py
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# One statement refills the bucket for the time elapsed and takes :cost tokens if
+# they are left, so concurrent workers on the host never both spend the last token
+TAKE_TOKEN = '''
+INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :capacity - :cost, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = CASE WHEN min(:capacity, tokens + (:now - updated) * :rate) >= :cost
+                  THEN min(:capacity, tokens + (:now - updated) * :rate) - :cost
+                  ELSE min(:capacity, tokens + (:now - updated) * :rate) END,
+    allowed = min(:capacity, tokens + (:now - updated) * :rate) >= :cost,
+    updated = :now
+RETURNING tokens, allowed
+'''
+
+# Buckets idle this long are full again and can be deleted
+IDLE_BUCKET_SECONDS = 3600
+
+
+class TokenBucketStore:
+    """Token buckets in a SQLite file shared by every worker process on the host.
+
+    The file holds nothing worth keeping: it runs without fsync, and if it
+    cannot be written the limiter lets requests through rather than failing them.
+    """
+
+    def __init__(self):
+        self.path = None
+        self._local = threading.local()
+        self._last_sweep = 0.0
+
+    def configure(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=0.05, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, key, capacity, period, cost=1):
+        """Spend cost tokens of key's bucket -> seconds to wait before retrying, or 0 if allowed.
+
+        cost must not exceed capacity, or the request could never be allowed.
+        """
+        rate = capacity / period
+        now = time.time()
+        try:
+            connection = self._connection()
+            tokens, allowed = connection.execute(TAKE_TOKEN, {'key': key, 'capacity': capacity, 'rate': rate,
+                                                              'cost': cost, 'now': now}).fetchone()
+            if now - self._last_sweep > IDLE_BUCKET_SECONDS:
+                self._last_sweep = now
+                connection.execute('DELETE FROM buckets WHERE updated < ?', (now - IDLE_BUCKET_SECONDS,))
+        except sqlite3.Error as e:
+            logger.warning('Rate limit store unavailable, allowing request: %s', e)
+            return 0
+        if allowed:
+            return 0
+        return max(1, math.ceil((cost - tokens) / rate))
+
+
+bucket_store = TokenBucketStore()
+
+
+def too_many_requests(retry_after):
+    response = jsonify({'success': False, 'message': 'Too many requests. Please try again later.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(scope, user_key=None, cost=None):
+    """Apply the RATE_LIMITS[scope] buckets per client IP and per user.
+
+    The client IP is request.remote_addr, which create_app resolves through
+    X-Forwarded-For when TRUSTED_PROXIES is set.
+
+    The user is user_key() when given (e.g. the email being logged in to),
+    otherwise the current_user passed in by token_required. cost() gives the
+    tokens a request spends (default 1), e.g. one per order in a batch; a
+    request costing more than a bucket holds is refused outright with 413 and
+    the largest cost allowed as `limit`.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            limits = current_app.config['RATE_LIMITS'].get(scope) if current_app.config['RATE_LIMITING'] else None
+            if limits:
+                if user_key:
+                    user = user_key()
+                else:
+                    user = getattr(args[0], 'id', None) if args else None
+                keys = [('ip', request.remote_addr)]
+                if user is not None:
+                    keys.append(('user', str(user).lower()))
+                buckets = [(key_type, value) + tuple(limits[key_type])
+                           for key_type, value in keys if key_type in limits and value]
+                tokens = cost() if cost else 1
+                largest = min((capacity for _, _, capacity, _ in buckets), default=tokens)
+                if tokens > largest:
+                    metrics.inc('eprashadam_rate_limited_total', scope=scope, key='size')
+                    response = jsonify({'success': False, 'limit': largest,
+                                        'message': f'Too large for the rate limit: at most {largest} per request.'})
+                    response.status_code = 413
+                    return response
+                for key_type, value, capacity, period in buckets:
+                    retry_after = bucket_store.take(f'{scope}:{key_type}:{value}', capacity, period, tokens)
+                    if retry_after:
+                        metrics.inc('eprashadam_rate_limited_total', scope=scope, key=key_type)
+                        return too_many_requests(retry_after)
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+class ConcurrencyLimiter:
+    """Caps requests in flight per process; the excess is answered 503 at once instead of queueing"""
+
+    def __init__(self):
+        self._semaphore = None
+        self.limit = 0
+
+    def configure(self, limit):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def try_acquire(self):
+        return self._semaphore is None or self._semaphore.acquire(blocking=False)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+concurrency_limiter = ConcurrencyLimiter()
+
+
+def init_load_shedding(app):
+    """Reject requests beyond MAX_CONCURRENT_REQUESTS before any work is done for them"""
+    bucket_store.configure(app.config['RATE_LIMIT_DB'])
+    concurrency_limiter.configure(app.config['MAX_CONCURRENT_REQUESTS'])
+    if app.config['MAX_CONCURRENT_REQUESTS'] <= 0:
+        return
+    exempt = app.config['CONCURRENCY_EXEMPT_ENDPOINTS']
+
+    @app.before_request
+    def _take_slot():
+        if request.endpoint in exempt:
+            return None
+        if not concurrency_limiter.try_acquire():
+            metrics.inc('eprashadam_requests_shed_total')
+            response = jsonify({'success': False, 'message': 'Server is busy. Please try again shortly.'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        g.concurrency_slot = True
+        return None
+
+    @app.teardown_request
+    def _release_slot(exc):
+        if g.pop('concurrency_slot', False):
+            concurrency_limiter.release()
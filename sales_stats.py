@@ -0,0 +1,183 @@
+# sales_stats.py
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Order, OrderItem, Temple, Prasadam, DailyTempleSales, DailyItemSales
+
+# Order status counted in the sales aggregates
+CONFIRMED_STATUS = 'confirmed'
+
+STATS_PERIODS = ('day', 'week')
+STATS_LEVELS = ('temple', 'item')
+
+# Longest range one stats request may cover
+STATS_MAX_DAYS = 731
+
+
+class StatsRangeError(ValueError):
+    """Raised for an invalid stats range; the message is safe to show to the client"""
+
+
+# Columns added onto an existing aggregate row
+TOTAL_COLUMNS = ('orders', 'quantity', 'revenue')
+
+
+def _upsert(table, rows, key_columns):
+    """INSERT rows, adding orders/quantity/revenue onto rows that already exist"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        statement = sqlite.insert(table)
+    elif dialect == 'postgresql':
+        statement = postgresql.insert(table)
+    else:
+        _update_or_insert(table, rows, key_columns)
+        return
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + statement.excluded[column] for column in TOTAL_COLUMNS}
+    )
+    db.session.execute(statement, rows)
+
+
+def _update_or_insert(table, rows, key_columns):
+    # Databases without ON CONFLICT: add onto the row, insert it if there was none.
+    # A concurrent first insert of the same key is retried as an update.
+    def add_to_existing(row):
+        return db.session.execute(
+            update(table)
+            .where(*[table.c[column] == row[column] for column in key_columns])
+            .values({column: table.c[column] + row[column] for column in TOTAL_COLUMNS})
+        ).rowcount
+
+    for row in rows:
+        if add_to_existing(row):
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table), row)
+        except IntegrityError:
+            add_to_existing(row)
+
+
+def record_confirmed_order(order):
+    """Add a newly confirmed order to the daily aggregates in the caller's transaction.
+
+    Call exactly once per order, when it moves to the confirmed status.
+    """
+    lines = db.session.query(OrderItem.temple_id, OrderItem.prasadam_id, OrderItem.quantity,
+                             OrderItem.unit_price)\
+        .filter(OrderItem.order_id == order.id)\
+        .all()
+    if not lines:
+        return
+    day = (order.created_at or datetime.utcnow()).date()
+
+    temples, items = {}, {}
+    for temple_id, prasadam_id, quantity, unit_price in lines:
+        for totals, key, extra in ((temples, temple_id, {}),
+                                   (items, prasadam_id, {'temple_id': temple_id, 'prasadam_id': prasadam_id})):
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = {'day': day, 'orders': 1, 'quantity': 0, 'revenue': 0.0, **extra}
+            entry['quantity'] += quantity
+            entry['revenue'] += quantity * unit_price
+    for temple_id, entry in temples.items():
+        entry['temple_id'] = temple_id
+
+    _upsert(DailyTempleSales.__table__, list(temples.values()), ['day', 'temple_id'])
+    _upsert(DailyItemSales.__table__, list(items.values()), ['day', 'prasadam_id'])
+
+
+def rebuild_sales_stats():
+    """Recompute both aggregate tables from order_items of confirmed orders"""
+    day = func.date(Order.created_at)
+    revenue = func.sum(OrderItem.quantity * OrderItem.unit_price)
+    confirmed = Order.status == CONFIRMED_STATUS
+
+    db.session.execute(DailyTempleSales.__table__.delete())
+    db.session.execute(DailyItemSales.__table__.delete())
+    db.session.execute(DailyTempleSales.__table__.insert().from_select(
+        ['day', 'temple_id', 'orders', 'quantity', 'revenue'],
+        select(day, OrderItem.temple_id, func.count(func.distinct(OrderItem.order_id)),
+               func.sum(OrderItem.quantity), revenue)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(confirmed)
+        .group_by(day, OrderItem.temple_id)
+    ))
+    db.session.execute(DailyItemSales.__table__.insert().from_select(
+        ['day', 'temple_id', 'prasadam_id', 'orders', 'quantity', 'revenue'],
+        select(day, OrderItem.temple_id, OrderItem.prasadam_id, func.count(func.distinct(OrderItem.order_id)),
+               func.sum(OrderItem.quantity), revenue)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(confirmed)
+        .group_by(day, OrderItem.temple_id, OrderItem.prasadam_id)
+    ))
+    db.session.commit()
+
+
+def parse_stats_range(since, until, days):
+    """(first_day, last_day), both inclusive; defaults to the last `days` days"""
+    try:
+        last_day = date.fromisoformat(until) if until else datetime.utcnow().date()
+        first_day = date.fromisoformat(since) if since else last_day - timedelta(days=int(days) - 1)
+    except (TypeError, ValueError):
+        raise StatsRangeError('since/until must be ISO dates (YYYY-MM-DD) and days an integer')
+    if first_day > last_day:
+        raise StatsRangeError('since must not be after until')
+    if (last_day - first_day).days >= STATS_MAX_DAYS:
+        raise StatsRangeError(f'A stats range may cover at most {STATS_MAX_DAYS} days')
+    return first_day, last_day
+
+
+def sales_rollup(first_day, last_day, period='day', level='temple', temple_id=None, prasadam_id=None):
+    """Orders, quantity and revenue per day or ISO week, read from the aggregate tables.
+
+    Reads at most one row per day and temple (or item) in the range, so the
+    cost follows the range requested, not the number of orders.
+    """
+    if level == 'temple':
+        table = DailyTempleSales
+        query = db.session.query(table.day, table.temple_id, Temple.name, table.orders, table.quantity,
+                                 table.revenue)
+    else:
+        table = DailyItemSales
+        query = db.session.query(table.day, table.temple_id, Temple.name, table.orders, table.quantity,
+                                 table.revenue, table.prasadam_id, Prasadam.name)\
+            .join(Prasadam, Prasadam.id == table.prasadam_id)
+        if prasadam_id:
+            query = query.filter(table.prasadam_id == prasadam_id)
+    query = query.join(Temple, Temple.id == table.temple_id)\
+        .filter(table.day >= first_day, table.day <= last_day)
+    if temple_id:
+        query = query.filter(table.temple_id == temple_id)
+
+    buckets = {}
+    for row in query.order_by(table.day):
+        day, row_temple_id, temple_name, orders, quantity, revenue = row[:6]
+        start = day - timedelta(days=day.weekday()) if period == 'week' else day
+        key = (start, row_temple_id) + tuple(row[6:7])
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {'period_start': start.isoformat(), 'temple_id': row_temple_id,
+                                     'temple_name': temple_name, 'orders': 0, 'quantity': 0, 'revenue': 0.0}
+            if level == 'item':
+                bucket.update({'prasadam_id': row[6], 'name': row[7]})
+        bucket['orders'] += orders
+        bucket['quantity'] += quantity
+        bucket['revenue'] += revenue
+
+    results = list(buckets.values())
+    for bucket in results:
+        bucket['revenue'] = round(bucket['revenue'], 2)
+    return results
+
+
+@click.command('rebuild-sales-stats')
+@with_appcontext
+def rebuild_sales_stats_command():
+    """Recompute the daily sales aggregates from confirmed orders (run after backfill-order-items)"""
+    rebuild_sales_stats()
+    click.echo('Sales aggregates rebuilt')
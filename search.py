@@ -0,0 +1,88 @@
+# search.py
+import heapq
+import math
+import re
+from bisect import bisect_left
+
+TOKEN = re.compile(r'\w+')
+
+# Weight of a match in each field; an item's temple name lets "kedarnath laddu" find Kedarnath's laddu
+TEMPLE_FIELDS = (('name', 3.0), ('location', 2.0), ('description', 1.0))
+PRASADAM_FIELDS = (('name', 3.0), ('temple_name', 1.5), ('description', 1.0))
+
+# A prefix match scores this fraction of a whole-word match
+PREFIX_FACTOR = 0.6
+
+# Shorter terms only match whole words; one letter would expand to most of the vocabulary
+MIN_PREFIX_LENGTH = 2
+
+# Completions considered per prefix, shortest-sorting first, to bound the work of a short prefix
+MAX_PREFIX_WORDS = 32
+
+MAX_QUERY_TERMS = 8
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower()) if text else []
+
+
+class SearchIndex:
+    """Inverted index over one catalog snapshot.
+
+    Postings map each word to {document: weight}; the vocabulary is kept
+    sorted so a prefix resolves to a contiguous slice with bisect. Every
+    query term must match (AND) and documents rank by the sum of field
+    weight x inverse document frequency.
+    """
+
+    def __init__(self, temples, prasadam):
+        self.documents = [('temple', t) for t in temples] + [('prasadam', p) for p in prasadam]
+        postings = {}
+        for doc_id, (kind, record) in enumerate(self.documents):
+            fields = TEMPLE_FIELDS if kind == 'temple' else PRASADAM_FIELDS
+            for field, weight in fields:
+                for word in set(tokenize(record.get(field))):
+                    doc_weights = postings.setdefault(word, {})
+                    doc_weights[doc_id] = max(doc_weights.get(doc_id, 0.0), weight)
+
+        total = len(self.documents) or 1
+        self.postings = {}
+        for word, doc_weights in postings.items():
+            idf = math.log(1 + total / len(doc_weights))
+            self.postings[word] = {doc_id: weight * idf for doc_id, weight in doc_weights.items()}
+        self.vocabulary = sorted(self.postings)
+
+    def _term_scores(self, term):
+        """{doc_id: score} for one query term: whole-word matches plus prefix matches"""
+        scores = dict(self.postings.get(term, {}))
+        if len(term) < MIN_PREFIX_LENGTH:
+            return scores
+        start = bisect_left(self.vocabulary, term)
+        for word in self.vocabulary[start:start + MAX_PREFIX_WORDS + 1]:
+            if not word.startswith(term):
+                break
+            if word == term:
+                continue
+            for doc_id, score in self.postings[word].items():
+                scores[doc_id] = max(scores.get(doc_id, 0.0), score * PREFIX_FACTOR)
+        return scores
+
+    def search(self, query, kind=None, limit=20):
+        """Ranked (kind, record, score) matches for every term of the query"""
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+
+        # Rarest term first keeps the candidate set small
+        term_scores = sorted((self._term_scores(term) for term in terms), key=len)
+        totals = term_scores[0]
+        for scores in term_scores[1:]:
+            totals = {doc_id: total + scores[doc_id] for doc_id, total in totals.items() if doc_id in scores}
+            if not totals:
+                return []
+
+        if kind:
+            totals = {doc_id: total for doc_id, total in totals.items() if self.documents[doc_id][0] == kind}
+        ranked = heapq.nsmallest(limit, totals.items(),
+                                 key=lambda match: (-match[1], self.documents[match[0]][1]['name']))
+        return [(*self.documents[doc_id], round(score, 3)) for doc_id, score in ranked]
@@ -0,0 +1,226 @@
+# session_store.py
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import delete, event, insert, select, update
+from werkzeug.datastructures import CallbackDict
+from models import db, User, WebSession
+from auth_cache import Principal
+
+# A loaded session: its data, the user it belongs to (or None) and when it expires
+SessionEntry = namedtuple('SessionEntry', ['data', 'principal', 'expires_at'])
+
+serializer = TaggedJSONSerializer()
+
+
+def _session_key(sid):
+    # Only a hash of the id is stored, so the table alone cannot be used to hijack sessions
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class SessionStore:
+    """web_sessions rows behind a bounded in-process LRU.
+
+    A cached entry is trusted for `cache_ttl` seconds, so a session ended or
+    a user disabled in another process takes effect within that time; in
+    this process it is immediate. Loading a session also loads its user, so
+    one lookup answers both "is there a session" and "who is it".
+    """
+
+    def __init__(self, maxsize=10000, cache_ttl=60, sweep_interval=300):
+        self.maxsize = maxsize
+        self.cache_ttl = cache_ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (SessionEntry, cached_until)
+        self._last_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize=None, cache_ttl=None, sweep_interval=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if cache_ttl is not None:
+                self.cache_ttl = cache_ttl
+            if sweep_interval is not None:
+                self.sweep_interval = sweep_interval
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def load(self, sid):
+        """SessionEntry for a cookie's session id, or None if it is unknown or expired"""
+        key = _session_key(sid)
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[1] > now and cached[0].expires_at > datetime.utcnow():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        row = db.session.execute(
+            select(WebSession.data, WebSession.expires_at, User.id, User.name, User.email, User.is_active)
+            .outerjoin(User, User.id == WebSession.user_id)
+            .where(WebSession.id == key, WebSession.expires_at > datetime.utcnow())
+        ).first()
+        if row is None:
+            self._forget(key)
+            return None
+        data, expires_at, user_id, name, email, is_active = row
+        principal = Principal(user_id, name, email, bool(is_active)) if user_id is not None else None
+        entry = SessionEntry(serializer.loads(data), principal, expires_at)
+        self._remember(key, entry)
+        return entry
+
+    def save(self, sid, data, lifetime):
+        """Write a session and return its new expiry"""
+        key = _session_key(sid)
+        expires_at = datetime.utcnow() + lifetime
+        values = {'user_id': data.get('user_id'), 'data': serializer.dumps(data), 'expires_at': expires_at}
+        with db.engine.begin() as connection:
+            updated = connection.execute(update(WebSession).where(WebSession.id == key).values(**values))
+            if not updated.rowcount:
+                connection.execute(insert(WebSession).values(id=key, **values))
+        self._forget(key)  # Reloaded with its user on the next request
+        self._maybe_sweep()
+        return expires_at
+
+    def delete(self, sid):
+        key = _session_key(sid)
+        with db.engine.begin() as connection:
+            connection.execute(delete(WebSession).where(WebSession.id == key))
+        self._forget(key)
+
+    def sweep(self):
+        """Delete expired sessions -> number deleted"""
+        with db.engine.begin() as connection:
+            result = connection.execute(delete(WebSession).where(WebSession.expires_at <= datetime.utcnow()))
+        return result.rowcount
+
+    def invalidate_user(self, user_id):
+        """Drop cached sessions of a user so the next request reloads them"""
+        with self._lock:
+            for key in [key for key, (entry, _) in self._entries.items()
+                        if entry.principal is not None and entry.principal.id == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key, entry):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, time.time() + self.cache_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        self.sweep()
+
+
+session_store = SessionStore()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user_sessions(mapper, connection, target):
+    session_store.invalidate_user(target.id)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data kept on the server; the cookie holds only `sid`"""
+
+    def __init__(self, initial=None, sid=None, principal=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.principal = principal
+        self.expires_at = expires_at
+        self.loaded_user_id = (initial or {}).get('user_id')
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session backend over session_store.
+
+    Expiry slides with use: a session lives PERMANENT_SESSION_LIFETIME past
+    its last write, and is rewritten once less than half of that remains.
+    The id changes whenever the signed-in user does, so an id planted before
+    login is worthless after it.
+    """
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = session_store.load(sid)
+            if entry is not None:
+                return ServerSession(entry.data, sid, entry.principal, entry.expires_at)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and session.sid:
+                session_store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        lifetime = app.permanent_session_lifetime
+        stale = session.expires_at is not None and session.expires_at - datetime.utcnow() < lifetime / 2
+        if not session.modified and not stale:
+            return
+        if session.sid is None or session.get('user_id') != session.loaded_user_id:
+            if session.sid:
+                session_store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+        session_store.save(session.sid, dict(session), lifetime)
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite)
+        response.vary.add('Cookie')
+
+
+def session_principal(session):
+    """User of a server-side session, resolved when the session was loaded; None otherwise"""
+    return getattr(session, 'principal', None)
+
+
+@click.command('sweep-sessions')
+@with_appcontext
+def sweep_sessions_command():
+    """Delete expired server-side sessions (also done periodically while serving)"""
+    click.echo(f'Deleted {session_store.sweep()} expired sessions')
@@ -0,0 +1,181 @@
+# stock.py
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, update
+from models import db, Order, Prasadam, StockReservation
+
+# Most timed-out reservations released by one sweep
+SWEEP_BATCH_SIZE = 500
+
+
+class OutOfStock(ValueError):
+    """Raised when a limited item cannot cover an order; the message is safe to show to the client"""
+
+
+def _take(prasadam_id, quantity):
+    # Conditional UPDATE: the row lock plus the re-checked WHERE make this safe under
+    # any number of concurrent buyers, and a sold-out item is never decremented below 0
+    result = db.session.execute(
+        update(Prasadam)
+        .where(Prasadam.id == prasadam_id, Prasadam.stock >= quantity)
+        .values(stock=Prasadam.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _put_back(prasadam_id, quantity):
+    db.session.execute(
+        update(Prasadam)
+        .where(Prasadam.id == prasadam_id, Prasadam.stock.isnot(None))
+        .values(stock=Prasadam.stock + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reserve_stock(cart):
+    """Take stock for the limited items of a priced cart -> [(prasadam_id, quantity)].
+
+    Items are taken in id order so concurrent carts lock rows in the same
+    order. An item that looks sold out first reclaims its timed-out
+    reservations. Raises OutOfStock after putting back anything already
+    taken, so the caller's transaction stays usable for other orders.
+    """
+    names = {line['id']: line['name'] for line in cart.lines}
+    taken = []
+    for prasadam_id, quantity, stock_seen in sorted(cart.limited):
+        ok = stock_seen >= quantity and _take(prasadam_id, quantity)
+        if not ok and release_expired_reservations([prasadam_id]):
+            ok = _take(prasadam_id, quantity)
+        if not ok:
+            for taken_id, taken_quantity in taken:
+                _put_back(taken_id, taken_quantity)
+            raise OutOfStock(f'Not enough {names[prasadam_id]} left for this order')
+        taken.append((prasadam_id, quantity))
+    return taken
+
+
+def record_reservations(taken_by_order):
+    """Store what reserve_stock() took, {order_id: taken}; held until STOCK_RESERVATION_TTL passes"""
+    expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['STOCK_RESERVATION_TTL'])
+    rows = [
+        {'order_id': order_id, 'prasadam_id': prasadam_id, 'quantity': quantity,
+         'status': 'held', 'expires_at': expires_at}
+        for order_id, taken in taken_by_order.items()
+        for prasadam_id, quantity in taken
+    ]
+    if rows:
+        db.session.execute(insert(StockReservation), rows)
+
+
+def hold_reservations(order_id):
+    """Keep an order's reservations from timing out while its payment is verified.
+
+    Returns False if they were already released, i.e. the stock is back on sale.
+    """
+    db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == order_id, StockReservation.status == 'held')
+        .values(expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    released = db.session.query(StockReservation.id)\
+        .filter_by(order_id=order_id, status='released')\
+        .first()
+    return released is None
+
+
+def rearm_reservations(order_id):
+    """Restart the timeout of reservations whose payment could not be verified"""
+    db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == order_id, StockReservation.status == 'held')
+        .values(expires_at=datetime.utcnow() + timedelta(seconds=current_app.config['STOCK_RESERVATION_TTL']))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def commit_reservations(order_id):
+    """The order is paid: its reserved stock is sold for good"""
+    db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == order_id, StockReservation.status == 'held')
+        .values(status='committed')
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_reservations(order_ids, expired_before=None):
+    """Put the held stock of these orders back on sale -> number of reservations released.
+
+    With expired_before, only reservations that timed out by then are released.
+    """
+    query = db.session.query(StockReservation.id, StockReservation.prasadam_id, StockReservation.quantity)\
+        .filter(StockReservation.order_id.in_(order_ids), StockReservation.status == 'held')
+    if expired_before:
+        query = query.filter(StockReservation.expires_at < expired_before)
+
+    released = 0
+    for reservation_id, prasadam_id, quantity in query.all():
+        # Conditional on still being held, so a concurrent sweep cannot release it twice
+        condition = [StockReservation.id == reservation_id, StockReservation.status == 'held']
+        if expired_before:
+            condition.append(StockReservation.expires_at < expired_before)
+        result = db.session.execute(
+            update(StockReservation).where(*condition).values(status='released')
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            _put_back(prasadam_id, quantity)
+            released += 1
+    return released
+
+
+def release_expired_reservations(prasadam_ids=None, now=None):
+    """Release timed-out reservations and expire their unpaid orders, in the caller's transaction.
+
+    prasadam_ids limits the sweep to orders holding those items. Returns the
+    number of reservations released.
+    """
+    now = now or datetime.utcnow()
+    query = db.session.query(StockReservation.order_id)\
+        .filter(StockReservation.status == 'held', StockReservation.expires_at < now)
+    if prasadam_ids:
+        query = query.filter(StockReservation.prasadam_id.in_(prasadam_ids))
+    order_ids = [order_id for order_id, in query.distinct().limit(SWEEP_BATCH_SIZE)]
+    if not order_ids:
+        return 0
+
+    released = release_reservations(order_ids, expired_before=now)
+    db.session.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.status == 'payment_pending')
+        .values(status='expired')
+        .execution_options(synchronize_session=False)
+    )
+    return released
+
+
+def set_stock(prasadam_id, stock):
+    """Set the units left to reserve (None for unlimited) -> False if the item does not exist"""
+    result = db.session.execute(
+        update(Prasadam).where(Prasadam.id == prasadam_id).values(stock=stock)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+@click.command('release-expired-stock')
+@with_appcontext
+def release_expired_stock_command():
+    """Put the stock of timed-out reservations back on sale (orders are also swept while ordering)"""
+    total = 0
+    while True:
+        released = release_expired_reservations()
+        db.session.commit()
+        if not released:
+            break
+        total += released
+    click.echo(f'Released {total} expired reservations')
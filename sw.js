@@ -1,10 +1,13 @@
 // Service Worker for E-Prashadam PWA
-const CACHE_NAME = 'e-prashadam-v1.0.0';
+const CACHE_NAME = 'e-prashadam-v1.0.3';
+// Bumped to drop API responses cached before only the public catalog was kept
+const API_CACHE_NAME = 'e-prashadam-api-v2';
+// Public catalog routes whose last good copy is kept for offline use; every
+// other API response is per-user or a write and never touches Cache Storage
+const OFFLINE_API_ROUTES = [/^\/api\/temples$/, /^\/api\/prasadam$/, /^\/api\/temples\/\d+\/prasadam$/];
+// Page shown for navigations while offline; the page itself is static, user data comes from the API
+const OFFLINE_PAGE = '/dashboard';
 const urlsToCache = [
-    '/',
-    '/index.html',
-    '/style.css',
-    '/script.js',
     'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
     'https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600;700&family=Playfair+Display:wght@700&display=swap',
     'https://images.unsplash.com/photo-1536093059670-8d6be2be30f7?ixlib=rb-4.0.3&auto=format&fit=crop&w=800&q=80'
@@ -16,7 +19,8 @@ self.addEventListener('install', event => {
         caches.open(CACHE_NAME)
             .then(cache => {
                 console.log('Opened cache');
-                return cache.addAll(urlsToCache);
+                // One unreachable CDN asset must not keep the worker from installing
+                return Promise.allSettled(urlsToCache.map(url => cache.add(url)));
             })
             .then(() => self.skipWaiting())
     );
@@ -28,7 +32,7 @@ self.addEventListener('activate', event => {
         caches.keys().then(cacheNames => {
             return Promise.all(
                 cacheNames.map(cacheName => {
-                    if (cacheName !== CACHE_NAME) {
+                    if (cacheName !== CACHE_NAME && cacheName !== API_CACHE_NAME) {
                         console.log('Deleting old cache:', cacheName);
                         return caches.delete(cacheName);
                     }
@@ -46,6 +50,51 @@ self.addEventListener('fetch', event => {
     // Skip Chrome extensions
     if (event.request.url.startsWith('chrome-extension://')) return;
     
+    const pathname = new URL(event.request.url).pathname;
+    if (pathname.startsWith('/api/')) {
+        // Private API calls bypass the worker entirely
+        if (!OFFLINE_API_ROUTES.some(route => route.test(pathname))) return;
+
+        // Catalog calls go to the network so the HTTP cache applies the server's
+        // Cache-Control/ETag revalidation; the last good copy is kept for offline use
+        event.respondWith(
+            fetch(event.request)
+                .then(response => {
+                    const cacheControl = response.headers.get('Cache-Control') || '';
+                    if (response.status === 200 && !cacheControl.includes('no-store')) {
+                        const responseToCache = response.clone();
+                        caches.open(API_CACHE_NAME)
+                            .then(cache => {
+                                cache.put(event.request, responseToCache);
+                            });
+                    }
+                    return response;
+                })
+                .catch(() => caches.match(event.request))
+        );
+        return;
+    }
+    
+    // Pages go to the network so sign-in redirects and logout always reach the
+    // server; the dashboard shell is kept for use while offline
+    if (event.request.mode === 'navigate') {
+        event.respondWith(
+            fetch(event.request)
+                .then(response => {
+                    if (pathname === OFFLINE_PAGE && response.status === 200 && !response.redirected) {
+                        const responseToCache = response.clone();
+                        caches.open(CACHE_NAME)
+                            .then(cache => {
+                                cache.put(OFFLINE_PAGE, responseToCache);
+                            });
+                    }
+                    return response;
+                })
+                .catch(() => caches.match(OFFLINE_PAGE))
+        );
+        return;
+    }
+    
     event.respondWith(
         caches.match(event.request)
             .then(response => {
@@ -74,11 +123,6 @@ self.addEventListener('fetch', event => {
                         });
                     
                     return response;
-                }).catch(() => {
-                    // If both cache and network fail, show offline page
-                    if (event.request.headers.get('accept').includes('text/html')) {
-                        return caches.match('/index.html');
-                    }
                 });
             })
     );
@@ -91,7 +135,71 @@ self.addEventListener('sync', event => {
     }
 });
 
+// Orders placed while offline wait in IndexedDB, keyed by idempotency key,
+// until a sync sends them to /api/orders/batch
+const OUTBOX_DB = 'e-prashadam-offline';
+const OUTBOX_STORE = 'orders';
+
+function openOutbox() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(OUTBOX_DB, 1);
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore(OUTBOX_STORE, { keyPath: 'idempotency_key' });
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function outboxRequest(db, mode, operation) {
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(OUTBOX_STORE, mode);
+        const request = operation(transaction.objectStore(OUTBOX_STORE));
+        transaction.oncomplete = () => resolve(request && request.result);
+        transaction.onerror = () => reject(transaction.error);
+    });
+}
+
 async function syncOrders() {
-    // Implement offline order sync here
-    console.log('Syncing offline orders...');
-}
\ No newline at end of file
+    const db = await openOutbox();
+    try {
+        const queued = await outboxRequest(db, 'readonly', store => store.getAll());
+        const results = [];
+        // The server answers 413 with the largest batch it takes (its batch cap or
+        // rate-limit burst); the rest goes in chunks of that size
+        let batchSize = queued.length;
+        for (let start = 0; start < queued.length; start += batchSize) {
+            const response = await fetch('/api/orders/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                credentials: 'include',
+                body: JSON.stringify({ orders: queued.slice(start, start + batchSize) })
+            });
+            if (response.status === 413) {
+                const limit = (await response.json()).limit;
+                if (Number.isInteger(limit) && limit > 0 && limit < batchSize) {
+                    batchSize = limit;
+                    start -= batchSize;  // Resend this chunk, smaller
+                    continue;
+                }
+            }
+            if (!response.ok) {
+                // Signed out or the server is failing: keep everything and let the browser retry
+                throw new Error('Order sync failed with status ' + response.status);
+            }
+            const data = await response.json();
+            // Drop orders the server has answered for; server errors stay queued
+            const settled = data.results.filter(result => result.idempotency_key && result.status < 500);
+            await outboxRequest(db, 'readwrite', store => {
+                settled.forEach(result => store.delete(result.idempotency_key));
+            });
+            results.push(...settled);
+        }
+        if (results.length) {
+            const clients = await self.clients.matchAll({ includeUncontrolled: true });
+            clients.forEach(client => client.postMessage({ type: 'orders-synced', results: results }));
+        }
+    } finally {
+        db.close();
+    }
+}